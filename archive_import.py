@@ -0,0 +1,51 @@
+from pathlib import Path, PurePosixPath
+import threading
+from typing import BinaryIO, Callable, Dict, List, Set, TypeVar
+import zipfile
+
+from mod_layout import ContentRoot, detect_mod_layout, map_mod_files
+
+T = TypeVar("T")
+
+
+def is_zip_archive(archive_path: Path) -> bool:
+    return zipfile.is_zipfile(str(archive_path))
+
+
+def list_zip_directories(zip_file: zipfile.ZipFile) -> Set[str]:
+    # Zips don't necessarily contain entries for directories, derive them from the member names
+    directories = set()
+    for member_name in zip_file.namelist():
+        member_path = PurePosixPath(member_name)
+        if member_name.endswith("/"):
+            directories.add(member_path.as_posix())
+        directories.update(parent.as_posix() for parent in member_path.parents if parent.as_posix() != ".")
+    return directories
+
+
+def detect_zip_mod_layout(archive_path: Path, moddable_folders: List[str]) -> ContentRoot:
+    with zipfile.ZipFile(str(archive_path)) as zip_file:
+        return detect_mod_layout(list_zip_directories(zip_file), moddable_folders)
+
+
+def list_zip_mod_members(zip_file: zipfile.ZipFile, content_root: ContentRoot) -> Dict[str, zipfile.ZipInfo]:
+    member_infos = {member_info.filename: member_info for member_info in zip_file.infolist()
+                    if not member_info.is_dir()}
+    return {mod_path: member_infos[member_name]
+            for mod_path, member_name in map_mod_files(member_infos, content_root).items()}
+
+
+class ConcurrentZipReader:
+    # Member streams of one ZipFile can be read from several threads, but opening and closing them is not thread safe
+    def __init__(self, zip_file: zipfile.ZipFile):
+        self.zip_file = zip_file
+        self._lock = threading.Lock()
+
+    def read_member(self, member_info: zipfile.ZipInfo, consumer: Callable[[BinaryIO], T]) -> T:
+        with self._lock:
+            member_stream = self.zip_file.open(member_info)
+        try:
+            return consumer(member_stream)
+        finally:
+            with self._lock:
+                member_stream.close()
@@ -0,0 +1,19 @@
+import json
+import os
+from pathlib import Path
+import tempfile
+
+
+def write_json_atomically(path: Path, data, **json_arguments):
+    # Readers see either the previous or the new contents, never a truncated file, even if the process is killed
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "w") as out_file:
+            json.dump(data, out_file, **json_arguments)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(temporary_path, str(path))
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
@@ -0,0 +1,185 @@
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+from typing import Dict, NamedTuple, Optional
+import zlib
+
+from atomic_file import write_json_atomically
+from content_hash import HASH_CHUNK_SIZE, new_hasher
+from instrumentation import BYTES_READ, BYTES_WRITTEN, FILES, STAT, Instrumentation
+
+BACKUP_INDEX_FILENAME = "backup_index.json"
+BACKUP_INDEX_VERSION = 1
+OBJECTS_FOLDER_NAME = "objects"
+COMPRESSED_OBJECT_SUFFIX = ".z"
+# Compressing these again only costs time, everything else, like atlases, skeletons and text, compresses well
+INCOMPRESSIBLE_SUFFIXES = [".png", ".jpg", ".jpeg", ".ogg", ".wav", ".bank", ".webm", ".zip"]
+
+# The size and modification time the original had in the game folder, -1 when unknown
+BackupEntry = NamedTuple("BackupEntry", [("hash", str), ("size", int), ("mtime_ns", int)])
+
+BackupIndex = Dict[str, BackupEntry]
+
+
+class BackupStore:
+    # The originals of the game files, stored once per content by hash and never rewritten while they are unchanged.
+    # The index maps a path relative to the game folder to the content of its original, it is only written by persist.
+    def __init__(self, folder: Path, instrumentation: Optional[Instrumentation] = None):
+        self.folder = folder
+        self.instrumentation = instrumentation or Instrumentation()
+        self.objects_folder = folder / OBJECTS_FOLDER_NAME
+        self.temporary_folder = self.objects_folder / "tmp"
+        self.temporary_folder.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = load_backup_index(folder)
+        self._index_changed = False
+
+    def has_backup(self, relative_path: str) -> bool:
+        backup_entry = self._index.get(relative_path)
+        return backup_entry is not None and self._find_object(backup_entry.hash) is not None
+
+    def back_up(self, source: Path, relative_path: str, mtime_ns: Optional[int] = None) -> bool:
+        # Returns False if there is no original to back up
+        self.instrumentation.count(STAT)
+        try:
+            source_stat = source.stat()
+        except FileNotFoundError:
+            return False
+        if mtime_ns is None:
+            mtime_ns = source_stat.st_mtime_ns
+
+        backup_entry = self._index.get(relative_path)
+        if backup_entry is not None and (backup_entry.size, backup_entry.mtime_ns) == (source_stat.st_size, mtime_ns) \
+                and self._find_object(backup_entry.hash) is not None:
+            return True
+
+        content_hash = self._add_object(source, compress=source.suffix.lower() not in INCOMPRESSIBLE_SUFFIXES)
+        with self._lock:
+            self._index[relative_path] = BackupEntry(hash=content_hash, size=source_stat.st_size, mtime_ns=mtime_ns)
+            self._index_changed = True
+        return True
+
+    def restore(self, relative_path: str, destination: Path):
+        # Any file at the destination is replaced, never written through, it may be a hardlink to a mod blob
+        backup_entry = self._index.get(relative_path)
+        object_path = self._find_object(backup_entry.hash) if backup_entry is not None else None
+        if object_path is None:
+            raise RuntimeError("The backup of {} is missing".format(relative_path))
+        if destination.is_file() or destination.is_symlink():
+            os.remove(str(destination))
+        destination.parent.mkdir(parents=True, exist_ok=True)
+
+        decompressor = zlib.decompressobj() if object_path.suffix == COMPRESSED_OBJECT_SUFFIX else None
+        with open(str(object_path), "rb") as in_file, open(str(destination), "wb") as out_file:
+            for chunk in iter(lambda: in_file.read(HASH_CHUNK_SIZE), b""):
+                self.instrumentation.count(BYTES_READ, len(chunk))
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+                out_file.write(chunk)
+                self.instrumentation.count(BYTES_WRITTEN, len(chunk))
+            if decompressor is not None:
+                out_file.write(decompressor.flush())
+        self.instrumentation.count(FILES)
+        # An unchanged original has the same modification time, so backing it up again is skipped
+        if backup_entry.mtime_ns >= 0:
+            os.utime(str(destination), ns=(backup_entry.mtime_ns, backup_entry.mtime_ns))
+
+    def forget(self, relative_path: str):
+        # The original was replaced in the game folder, e.g. by a game update, its backup is stale
+        with self._lock:
+            if self._index.pop(relative_path, None) is not None:
+                self._index_changed = True
+
+    def persist(self):
+        with self._lock:
+            if not self._index_changed:
+                return
+            persist_backup_index(self.folder, self._index)
+            self._index_changed = False
+
+    def _object_path(self, content_hash: str, compressed: bool) -> Path:
+        object_path = self.objects_folder / content_hash[:2] / content_hash[2:]
+        return object_path.with_suffix(COMPRESSED_OBJECT_SUFFIX) if compressed else object_path
+
+    def _find_object(self, content_hash: str) -> Optional[Path]:
+        for compressed in (True, False):
+            object_path = self._object_path(content_hash, compressed)
+            if object_path.is_file():
+                return object_path
+        return None
+
+    def _add_object(self, source: Path, compress: bool) -> str:
+        hasher = new_hasher()
+        compressor = zlib.compressobj() if compress else None
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=str(self.temporary_folder))
+        try:
+            with open(str(source), "rb") as in_file, os.fdopen(file_descriptor, "wb") as out_file:
+                for chunk in iter(lambda: in_file.read(HASH_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+                    self.instrumentation.count(BYTES_READ, len(chunk))
+                    if compressor is not None:
+                        chunk = compressor.compress(chunk)
+                    out_file.write(chunk)
+                    self.instrumentation.count(BYTES_WRITTEN, len(chunk))
+                if compressor is not None:
+                    out_file.write(compressor.flush())
+            self.instrumentation.count(FILES)
+            content_hash = hasher.hexdigest()
+            if self._find_object(content_hash) is not None:
+                os.remove(temporary_path)
+            else:
+                object_path = self._object_path(content_hash, compress)
+                object_path.parent.mkdir(exist_ok=True)
+                os.replace(temporary_path, str(object_path))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return content_hash
+
+    def migrate_legacy_backups(self):
+        # Older versions kept a plain copy of every original at its path, and removed it on restore
+        legacy_backup_paths = []
+        directories = [self.folder]
+        while directories:
+            with os.scandir(str(directories.pop())) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path != str(self.objects_folder):
+                            directories.append(Path(entry.path))
+                    elif entry.path != os.path.join(str(self.folder), entry.name):
+                        # Files in the backup folder itself are the index and its temporary files
+                        legacy_backup_paths.append(Path(entry.path))
+        if not legacy_backup_paths:
+            return
+
+        for legacy_backup_path in legacy_backup_paths:
+            self.back_up(legacy_backup_path, legacy_backup_path.relative_to(self.folder).as_posix(), mtime_ns=-1)
+        self.persist()
+        for legacy_backup_path in legacy_backup_paths:
+            os.remove(str(legacy_backup_path))
+        for directory_path, _, _ in sorted(os.walk(str(self.folder)), reverse=True):
+            if directory_path != str(self.folder) and not directory_path.startswith(str(self.objects_folder)):
+                os.rmdir(directory_path)
+
+
+def load_backup_index(folder: Path) -> BackupIndex:
+    backup_index_path = folder / BACKUP_INDEX_FILENAME
+    if not backup_index_path.is_file():
+        return {}
+    try:
+        with open(str(backup_index_path), "r") as index_in_file:
+            index_dict = json.load(index_in_file)
+            if index_dict["version"] != BACKUP_INDEX_VERSION:
+                raise ValueError("Unknown backup index version {}".format(index_dict["version"]))
+            return {path: BackupEntry(*entry) for path, entry in index_dict["files"].items()}
+    except (KeyError, TypeError, ValueError) as e:
+        raise RuntimeError("Corrupt backup index {}, {}".format(backup_index_path, e))
+
+
+def persist_backup_index(folder: Path, backup_index: BackupIndex):
+    index_dict = {"version": BACKUP_INDEX_VERSION,
+                  "files": {path: list(entry) for path, entry in sorted(backup_index.items())}}
+    write_json_atomically(folder / BACKUP_INDEX_FILENAME, index_dict, separators=(",", ":"))
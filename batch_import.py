@@ -0,0 +1,77 @@
+from pathlib import Path
+import re
+import tempfile
+from typing import Dict, List, NamedTuple, Tuple
+import zipfile
+
+from archive_import import is_zip_archive, list_zip_directories, list_zip_mod_members
+from blob_store import BlobStore
+from mod_layout import detect_mod_layout, iterate_directories, iterate_mod_files
+from mod_manifest import ModFile, ModManifest
+
+ARCHIVE_SUFFIXES = [".zip", ".rar", ".7z"]
+
+ImportReport = NamedTuple("ImportReport", [("succeeded", List[str]), ("skipped", List[Tuple[str, str]]),
+                                           ("failed", List[Tuple[str, str]])])
+
+
+def collect_import_sources(library_folder: Path) -> List[Path]:
+    return sorted(content for content in library_folder.iterdir()
+                  if content.is_dir() or content.suffix.lower() in ARCHIVE_SUFFIXES)
+
+
+def derive_mod_name(source: Path) -> str:
+    mod_name = source.name if source.is_dir() else source.stem
+    return re.sub(r'[<>:"/\\|?*]', "_", mod_name).strip()
+
+
+def prepare_mod(source: Path, moddable_folders: List[str], blob_store_folder: Path,
+                extraction_folder: Path) -> ModManifest:
+    # Runs in a worker process, only the blob store is written, the managed mod itself is created by the caller
+    blob_store = BlobStore(blob_store_folder)
+    if source.is_dir():
+        return _prepare_mod_from_folder(source, moddable_folders, blob_store)
+    if is_zip_archive(source):
+        return _prepare_mod_from_zip(source, moddable_folders, blob_store)
+
+    import patoolib
+    with tempfile.TemporaryDirectory(dir=str(extraction_folder)) as temp_dir:
+        patoolib.extract_archive(str(source), outdir=temp_dir, verbosity=-1, interactive=False)
+        return _prepare_mod_from_folder(Path(temp_dir), moddable_folders, blob_store)
+
+
+def _prepare_mod_from_folder(folder: Path, moddable_folders: List[str], blob_store: BlobStore) -> ModManifest:
+    content_root = detect_mod_layout(iterate_directories(folder), moddable_folders)
+    mod_manifest = {}
+    for mod_path, file_entry in iterate_mod_files(folder, content_root):
+        mod_manifest[mod_path] = ModFile(hash=blob_store.add_file(folder / file_entry.path), size=file_entry.size)
+    return mod_manifest
+
+
+def _prepare_mod_from_zip(archive_path: Path, moddable_folders: List[str], blob_store: BlobStore) -> ModManifest:
+    with zipfile.ZipFile(str(archive_path)) as zip_file:
+        content_root = detect_mod_layout(list_zip_directories(zip_file), moddable_folders)
+        mod_manifest = {}
+        for mod_path, member_info in list_zip_mod_members(zip_file, content_root).items():
+            with zip_file.open(member_info) as member_stream:
+                mod_manifest[mod_path] = ModFile(hash=blob_store.add_stream(member_stream), size=member_info.file_size)
+    return mod_manifest
+
+
+def assign_mod_names(sources: List[Path], managed_mod_names: List[str]) -> Tuple[Dict[str, Path],
+                                                                                 List[Tuple[str, str]]]:
+    mod_sources = {}
+    skipped = []
+    for source in sources:
+        mod_name = derive_mod_name(source)
+        if not source.exists():
+            skipped.append((str(source), "not found"))
+        elif not mod_name:
+            skipped.append((str(source), "could not derive a mod name"))
+        elif mod_name in managed_mod_names:
+            skipped.append((str(source), "there is a managed mod called '{}' already".format(mod_name)))
+        elif mod_name in mod_sources:
+            skipped.append((str(source), "'{}' is imported from {} already".format(mod_name, mod_sources[mod_name])))
+        else:
+            mod_sources[mod_name] = source
+    return mod_sources, skipped
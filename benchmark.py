@@ -0,0 +1,271 @@
+import argparse
+import json
+import math
+import os
+from pathlib import Path
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple
+import zipfile
+
+from instrumentation import PhaseRecord
+from model import MainWindowModel
+
+BENCHMARK_RESULTS_VERSION = 1
+HEROES = ["arbalest", "bounty_hunter", "crusader", "grave_robber", "hellion", "highwayman", "houndmaster", "jester",
+          "leper", "man_at_arms", "occultist", "plague_doctor", "vestal", "abomination", "antiquarian", "flagellant"]
+
+SyntheticMod = NamedTuple("SyntheticMod", [("name", str), ("folder", Path), ("files", int), ("bytes", int)])
+
+
+class FileContentGenerator:
+    # Slices of one random block with a unique header, so files neither compress nor deduplicate, but are cheap to make
+    def __init__(self, random_generator: random.Random, mean_file_size: int, file_size_sigma: float):
+        self.random_generator = random_generator
+        self.mean_file_size = mean_file_size
+        self.file_size_sigma = file_size_sigma
+        self.block = random_generator.getrandbits(8 * 1024 * 1024).to_bytes(1024 * 1024, "little")
+        self.counter = 0
+
+    def next_file_size(self) -> int:
+        if self.file_size_sigma == 0:
+            return self.mean_file_size
+        # Log-normal, with its mean at mean_file_size
+        mu = math.log(self.mean_file_size) - self.file_size_sigma ** 2 / 2
+        return max(1, int(self.random_generator.lognormvariate(mu, self.file_size_sigma)))
+
+    def write_file(self, path: Path) -> int:
+        size = self.next_file_size()
+        self.counter += 1
+        header = "{:016d}".format(self.counter).encode()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path), "wb") as out_file:
+            out_file.write(header[:size])
+            remaining = size - len(header)
+            offset = self.counter % len(self.block)
+            while remaining > 0:
+                chunk = self.block[offset:offset + remaining]
+                out_file.write(chunk)
+                remaining -= len(chunk)
+                offset = 0
+        return size
+
+
+def generate_synthetic_collection(work_folder: Path, arguments) -> (Path, List[SyntheticMod]):
+    random_generator = random.Random(arguments.seed)
+    content_generator = FileContentGenerator(random_generator, arguments.mean_file_size, arguments.file_size_sigma)
+
+    # Paths in the shared pool are shipped by several mods, the remaining paths of a mod are its own
+    shared_path_count = max(1, int(arguments.files_per_mod * arguments.overlap_ratio * 2))
+    shared_paths = ["heroes/{}/{}_shared/shared_{}.png".format(HEROES[index % len(HEROES)],
+                                                               HEROES[index % len(HEROES)], index)
+                    for index in range(shared_path_count)]
+
+    game_folder = work_folder / "game"
+    game_folder.mkdir()
+    for shared_path in shared_paths:
+        if random_generator.random() < arguments.original_ratio:
+            content_generator.write_file(game_folder / shared_path)
+
+    mods = []
+    for mod_index in range(arguments.mods):
+        mod_name = "mod_{:04d}".format(mod_index)
+        mod_folder = work_folder / "sources" / mod_name
+        hero = HEROES[mod_index % len(HEROES)]
+        shared_files = int(arguments.files_per_mod * arguments.overlap_ratio)
+        relative_paths = random_generator.sample(shared_paths, min(shared_files, len(shared_paths)))
+        relative_paths.extend("heroes/{}/{}_{}/{}.png".format(hero, hero, mod_name, file_index)
+                              for file_index in range(arguments.files_per_mod - len(relative_paths)))
+
+        mod_bytes = 0
+        for relative_path in relative_paths:
+            mod_bytes += content_generator.write_file(mod_folder / "SkinPack" / relative_path)
+        mods.append(SyntheticMod(name=mod_name, folder=mod_folder, files=len(relative_paths), bytes=mod_bytes))
+    return game_folder, mods
+
+
+def create_zip_archives(work_folder: Path, mods: List[SyntheticMod]) -> List[Path]:
+    archive_folder = work_folder / "archives"
+    archive_folder.mkdir()
+    archives = []
+    for mod in mods:
+        archive_path = archive_folder / (mod.name + ".zip")
+        with zipfile.ZipFile(str(archive_path), "w", compression=zipfile.ZIP_STORED) as zip_file:
+            for directory_path, _, file_names in os.walk(str(mod.folder)):
+                for file_name in file_names:
+                    file_path = Path(directory_path) / file_name
+                    zip_file.write(str(file_path), file_path.relative_to(mod.folder).as_posix())
+        archives.append(archive_path)
+    return archives
+
+
+class BenchmarkRecorder:
+    def __init__(self):
+        self.measurements = {}
+        self._phase_records = []
+
+    def observe_phase(self, phase_record: PhaseRecord):
+        self._phase_records.append(phase_record)
+
+    def measure(self, operation: str, function: Callable, files: int = 0, total_bytes: int = 0):
+        self._phase_records.clear()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        measurement = self.measurements.setdefault(operation, {"seconds": [], "files": files, "bytes": total_bytes,
+                                                               "phases": {}})
+        measurement["seconds"].append(elapsed)
+        # The phases are summed over the runs, e.g. over every mod added
+        for phase_record in self._phase_records:
+            phase = measurement["phases"].setdefault(phase_record.phase, {"seconds": 0.0, "counters": {}})
+            phase["seconds"] += phase_record.seconds
+            for counter, amount in phase_record.counters.items():
+                phase["counters"][counter] = phase["counters"].get(counter, 0) + amount
+        return result
+
+    def results(self) -> List[Dict]:
+        results = []
+        for operation, measurement in self.measurements.items():
+            seconds = measurement["seconds"]
+            throughput = measurement["bytes"] / min(seconds) / 1e6 if measurement["bytes"] and min(seconds) else None
+            results.append({"operation": operation, "runs": len(seconds), "min_seconds": min(seconds),
+                            "median_seconds": statistics.median(seconds), "files": measurement["files"],
+                            "bytes": measurement["bytes"], "megabytes_per_second": throughput,
+                            "phases": measurement["phases"]})
+        return results
+
+
+def create_model(manager_folder: Path, game_folder: Path, configuration: Dict,
+                 recorder: BenchmarkRecorder) -> MainWindowModel:
+    manager_folder.mkdir(exist_ok=True)
+    model = MainWindowModel(configuration, mod_manager_folder=str(manager_folder), game_folder=str(game_folder))
+    model.add_instrumentation_observer(recorder.observe_phase)
+    return model
+
+
+def run_benchmark(arguments, configuration: Dict) -> Dict:
+    recorder = BenchmarkRecorder()
+    with tempfile.TemporaryDirectory(dir=arguments.work_folder) as work_folder:
+        work_folder_path = Path(work_folder)
+        game_folder, mods = generate_synthetic_collection(work_folder_path, arguments)
+        total_files = sum(mod.files for mod in mods)
+        total_bytes = sum(mod.bytes for mod in mods)
+
+        manager_folder = work_folder_path / "manager"
+        model = recorder.measure("startup_empty",
+                                 lambda: create_model(manager_folder, game_folder, configuration, recorder))
+
+        for mod in mods:
+            content_folder = recorder.measure("find_or_create_mod_content_folder",
+                                              lambda: model.find_or_create_mod_content_folder(str(mod.folder)),
+                                              files=total_files)
+            recorder.measure("add_mod", lambda: model.add_mod(mod.name, content_folder), files=total_files,
+                             total_bytes=total_bytes)
+        # Sum the per-mod measurements into one per collection
+        for operation in ["find_or_create_mod_content_folder", "add_mod"]:
+            recorder.measurements[operation]["seconds"] = [sum(recorder.measurements[operation]["seconds"])]
+
+        if arguments.zip_import:
+            archives = create_zip_archives(work_folder_path, mods)
+            zip_model = create_model(work_folder_path / "zip_manager", game_folder, configuration, recorder)
+            recorder.measure("import_mods_zip", lambda: zip_model.import_mods(archives), files=total_files,
+                             total_bytes=total_bytes)
+            zip_model.close()
+
+        toggled_mod = mods[len(mods) // 2]
+        for _ in range(arguments.repeat):
+            for mod in mods:
+                model.activate_mod(mod.name)
+            recorder.measure("deploy_all", model.deploy_mods, files=total_files, total_bytes=total_bytes)
+            recorder.measure("deploy_unchanged", model.deploy_mods)
+            startup_model = recorder.measure("startup_deployed",
+                                             lambda: create_model(manager_folder, game_folder, configuration, recorder))
+            startup_model.close()
+            # Only the conflict detection of a freshly loaded model is measured, not the loading
+            conflicts_model = create_model(manager_folder, game_folder, configuration, recorder)
+            recorder.measure("conflicts", conflicts_model.get_conflicts)
+            conflicts_model.close()
+
+            model.deactivate_mod(toggled_mod.name)
+            recorder.measure("deploy_toggle_one", model.deploy_mods, files=toggled_mod.files,
+                             total_bytes=toggled_mod.bytes)
+            for mod in mods:
+                if mod is not toggled_mod:
+                    model.deactivate_mod(mod.name)
+            recorder.measure("restore", model.deploy_mods, files=total_files, total_bytes=total_bytes)
+
+    return {"version": BENCHMARK_RESULTS_VERSION,
+            "revision": _get_git_revision(),
+            "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpu_count": os.cpu_count()},
+            "parameters": {"mods": arguments.mods, "files_per_mod": arguments.files_per_mod,
+                           "mean_file_size": arguments.mean_file_size, "file_size_sigma": arguments.file_size_sigma,
+                           "overlap_ratio": arguments.overlap_ratio, "original_ratio": arguments.original_ratio,
+                           "seed": arguments.seed, "repeat": arguments.repeat,
+                           "total_files": total_files, "total_bytes": total_bytes},
+            "results": recorder.results()}
+
+
+def _get_git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(Path(__file__).parent),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_results(baseline: Dict, current: Dict) -> List[str]:
+    baseline_results = {result["operation"]: result for result in baseline["results"]}
+    lines = ["{:<36}{:>12}{:>12}{:>10}".format("operation", "baseline s", "current s", "speedup")]
+    for result in current["results"]:
+        baseline_result = baseline_results.get(result["operation"])
+        if baseline_result is None:
+            continue
+        speedup = baseline_result["min_seconds"] / result["min_seconds"] if result["min_seconds"] else float("inf")
+        lines.append("{:<36}{:>12.4f}{:>12.4f}{:>9.2f}x".format(result["operation"], baseline_result["min_seconds"],
+                                                                result["min_seconds"], speedup))
+    return lines
+
+
+def parse_arguments():
+    argument_parser = argparse.ArgumentParser(description="Times the model operations on a synthetic game folder and "
+                                                          "mod collection, and prints the results as JSON")
+    argument_parser.add_argument("--mods", type=int, default=20, help="Number of mods")
+    argument_parser.add_argument("--files-per-mod", type=int, default=100, help="Number of files in each mod")
+    argument_parser.add_argument("--mean-file-size", type=int, default=64 * 1024, help="Mean file size in bytes")
+    argument_parser.add_argument("--file-size-sigma", type=float, default=1.0,
+                                 help="Sigma of the log-normal file size distribution, 0 for constant sizes")
+    argument_parser.add_argument("--overlap-ratio", type=float, default=0.2,
+                                 help="Ratio of the files of each mod which other mods ship too")
+    argument_parser.add_argument("--original-ratio", type=float, default=0.5,
+                                 help="Ratio of the shared paths which exist in the game folder and need a backup")
+    argument_parser.add_argument("--repeat", type=int, default=3, help="Number of deploy cycles to time")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument("--zip-import", action="store_true", help="Time batch importing zip archives too")
+    argument_parser.add_argument("--work-folder", default=None,
+                                 help="Where to generate the synthetic data, defaults to the system temp folder")
+    argument_parser.add_argument("--output", type=Path, help="Write the results to this file instead of stdout")
+    argument_parser.add_argument("--compare", type=Path, help="Results of an earlier run to compare against")
+    return argument_parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    with open("configuration.json") as config_file:
+        configuration = json.load(config_file)
+
+    results = run_benchmark(arguments, configuration)
+    if arguments.output:
+        with open(str(arguments.output), "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if arguments.compare:
+        with open(str(arguments.compare)) as baseline_file:
+            print("\n".join(compare_results(json.load(baseline_file), results)), file=sys.stderr)
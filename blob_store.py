@@ -0,0 +1,107 @@
+import errno
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import BinaryIO, Optional
+
+from content_hash import HASH_CHUNK_SIZE, new_hasher
+from instrumentation import BYTES_READ, BYTES_WRITTEN, FILES, LINK, MKDIR, STAT, UNLINK, Instrumentation
+
+try:
+    import fcntl
+    # Linux ioctl which shares the extents of a file on copy-on-write filesystems, like btrfs and xfs
+    FICLONE = 0x40049409
+except ImportError:
+    fcntl = None
+
+
+class BlobStore:
+    # Blobs are hardlinked into the mod contents folders and the game folder. The manager never writes through a link,
+    # but anything else writing a linked file in place changes the blob, and with it every mod and deployed path sharing
+    # the content. Blobs are left writable, read only files can't be replaced on Windows, e.g. by a game update, so such
+    # writes are detected by revalidation and verification instead.
+    def __init__(self, folder: Path, instrumentation: Optional[Instrumentation] = None):
+        self.folder = folder
+        self.instrumentation = instrumentation or Instrumentation()
+        self.temporary_folder = folder / "tmp"
+        self.temporary_folder.mkdir(parents=True, exist_ok=True)
+        self._reflink_supported = fcntl is not None
+
+    def blob_path(self, content_hash: str) -> Path:
+        return self.folder / content_hash[:2] / content_hash[2:]
+
+    def has_blob(self, content_hash: str) -> bool:
+        return self.blob_path(content_hash).is_file()
+
+    def add_file(self, source: Path) -> str:
+        with open(str(source), "rb") as in_file:
+            return self.add_stream(in_file)
+
+    def add_stream(self, in_stream: BinaryIO) -> str:
+        hasher = new_hasher()
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=str(self.temporary_folder))
+        try:
+            with os.fdopen(file_descriptor, "wb") as out_file:
+                for chunk in iter(lambda: in_stream.read(HASH_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+                    out_file.write(chunk)
+                    self.instrumentation.count(BYTES_READ, len(chunk))
+                    self.instrumentation.count(BYTES_WRITTEN, len(chunk))
+            self.instrumentation.count(FILES)
+            content_hash = hasher.hexdigest()
+            blob_path = self.blob_path(content_hash)
+            if blob_path.is_file():
+                os.remove(temporary_path)
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                os.replace(temporary_path, str(blob_path))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return content_hash
+
+    def remove_blob(self, content_hash: str):
+        blob_path = self.blob_path(content_hash)
+        if blob_path.is_file():
+            os.remove(str(blob_path))
+            self.instrumentation.count(UNLINK)
+
+    def link_or_copy(self, content_hash: str, destination: Path):
+        # The destination is always unlinked first, the manager itself never writes through an existing hardlink
+        blob_path = self.blob_path(content_hash)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        self.instrumentation.count(MKDIR)
+        self.instrumentation.count(FILES)
+        self.instrumentation.count(STAT)
+        if destination.is_file() or destination.is_symlink():
+            os.remove(str(destination))
+            self.instrumentation.count(UNLINK)
+
+        if self._reflink(blob_path, destination):
+            self.instrumentation.count(LINK)
+            return
+        try:
+            os.link(str(blob_path), str(destination))
+            self.instrumentation.count(LINK)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+                raise
+            shutil.copyfile(str(blob_path), str(destination))
+            if self.instrumentation.enabled:
+                self.instrumentation.count(BYTES_READ, blob_path.stat().st_size)
+                self.instrumentation.count(BYTES_WRITTEN, blob_path.stat().st_size)
+
+    def _reflink(self, source: Path, destination: Path) -> bool:
+        if not self._reflink_supported:
+            return False
+        with open(str(source), "rb") as in_file, open(str(destination), "wb") as out_file:
+            try:
+                fcntl.ioctl(out_file.fileno(), FICLONE, in_file.fileno())
+                return True
+            except OSError:
+                # Not a copy-on-write filesystem, don't try again for the lifetime of the store
+                self._reflink_supported = False
+        os.remove(str(destination))
+        return False
@@ -0,0 +1,30 @@
+from typing import Dict, Iterable, List, Tuple
+
+# Relative path -> every mod shipping it, in load order
+PathIndex = Dict[str, List[str]]
+
+
+def build_path_index(mod_files: Iterable[Tuple[str, Iterable[str]]]) -> PathIndex:
+    path_index = {}
+    for mod_name, relative_paths in mod_files:
+        for relative_path in relative_paths:
+            path_index.setdefault(relative_path, []).append(mod_name)
+    return path_index
+
+
+def resolve_file_owners(path_index: PathIndex) -> Dict[str, str]:
+    return {relative_path: mod_names[-1] for relative_path, mod_names in path_index.items()}
+
+
+def find_conflicts(path_index: PathIndex) -> Dict[Tuple[str, str], List[str]]:
+    # Keyed by (overridden mod, overriding mod)
+    conflicts = {}
+    for relative_path, mod_names in path_index.items():
+        if len(mod_names) < 2:
+            continue
+        for overridden_index, overridden_mod in enumerate(mod_names[:-1]):
+            for overriding_mod in mod_names[overridden_index + 1:]:
+                conflicts.setdefault((overridden_mod, overriding_mod), []).append(relative_path)
+    for conflicting_paths in conflicts.values():
+        conflicting_paths.sort()
+    return conflicts
@@ -0,0 +1,17 @@
+import hashlib
+from pathlib import Path
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_file(path: Path) -> str:
+    hasher = new_hasher()
+    with open(str(path), "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+from progress import OperationCancelled, OperationProgress
+
+DEFAULT_COPY_WORKERS = 8
+DEFAULT_COPY_QUEUE_BYTES = 256 * 1024 * 1024
+
+# Every job is charged at least this much against the byte budget, so floods of tiny files are bounded too
+MINIMUM_JOB_COST = 64 * 1024
+
+
+class CopyError(RuntimeError):
+    def __init__(self, failures: List[Tuple[str, BaseException]]):
+        self.failures = failures
+        super().__init__("{} file transfer(s) failed, first: {}: {}".format(len(failures), *failures[0]))
+
+
+class CopyEngine:
+    def __init__(self, max_workers: int = DEFAULT_COPY_WORKERS, max_queued_bytes: int = DEFAULT_COPY_QUEUE_BYTES,
+                 progress: Optional[OperationProgress] = None):
+        self._progress = progress
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="copy_engine")
+        self._max_queued_bytes = max_queued_bytes
+        self._queued_bytes = 0
+        self._condition = threading.Condition()
+        self._pending = []
+
+    def submit(self, description: str, transfer: Callable, *args, size: int = 0):
+        # Blocks until the queued transfers fit in the byte budget, a single oversized transfer is always admitted
+        if self._progress is not None:
+            self._progress.check_cancelled()
+        cost = max(size, MINIMUM_JOB_COST)
+        with self._condition:
+            while self._queued_bytes > 0 and self._queued_bytes + cost > self._max_queued_bytes:
+                self._condition.wait()
+            self._queued_bytes += cost
+        self._pending.append((description, self._executor.submit(self._run, size, cost, transfer, args)))
+
+    def _run(self, size: int, cost: int, transfer: Callable, args: Tuple) -> Any:
+        try:
+            if self._progress is None:
+                return transfer(*args)
+            # Transfers still queued when the operation is cancelled are skipped
+            self._progress.check_cancelled()
+            result = transfer(*args)
+            self._progress.advance(size)
+            return result
+        finally:
+            with self._condition:
+                self._queued_bytes -= cost
+                self._condition.notify_all()
+
+    def wait(self) -> List[Any]:
+        # Results and failures are reported in submission order, regardless of completion order
+        results = []
+        failures = []
+        for description, future in self._pending:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(None)
+                failures.append((description, e))
+        self._pending = []
+        if failures and self._progress is not None and self._progress.cancelled:
+            raise OperationCancelled()
+        if failures:
+            raise CopyError(failures)
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self._pending = []
+
+    def __enter__(self) -> "CopyEngine":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self.shutdown()
@@ -0,0 +1,56 @@
+import json
+import os
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from atomic_file import write_json_atomically
+from deployment_index import DeployedFile
+
+# The deployed file of a path before and after the deploy, None if the path is not deployed
+JournalOperation = NamedTuple("JournalOperation", [("path", str), ("old", Optional[DeployedFile]),
+                                                   ("new", Optional[DeployedFile])])
+
+# In the backup phase only originals are copied to the backup folder, the game folder is touched in the apply phase
+BACKUP_PHASE = "backup"
+APPLY_PHASE = "apply"
+
+DeployJournal = NamedTuple("DeployJournal", [("phase", str), ("previous_deployed_mods", List[str]),
+                                             ("deployed_mods", List[str]), ("operations", List[JournalOperation])])
+
+DEPLOY_JOURNAL_FILENAME = "deploy_journal.json"
+
+
+def _entry_to_list(deployed_file: Optional[DeployedFile]) -> Optional[list]:
+    return list(deployed_file) if deployed_file is not None else None
+
+
+def _entry_from_list(entry: Optional[list]) -> Optional[DeployedFile]:
+    return DeployedFile(*entry) if entry is not None else None
+
+
+def load_deploy_journal(folder: Path) -> Optional[DeployJournal]:
+    deploy_journal_path = folder / DEPLOY_JOURNAL_FILENAME
+    if not deploy_journal_path.is_file():
+        return None
+    try:
+        with open(str(deploy_journal_path), "r") as journal_in_file:
+            journal_dict = json.load(journal_in_file)
+            operations = [JournalOperation(path, _entry_from_list(old), _entry_from_list(new))
+                          for path, old, new in journal_dict["operations"]]
+            return DeployJournal(phase=journal_dict["phase"],
+                                 previous_deployed_mods=journal_dict["previous_deployed_mods"],
+                                 deployed_mods=journal_dict["deployed_mods"], operations=operations)
+    except (KeyError, TypeError, ValueError) as e:
+        raise RuntimeError("Corrupt deploy journal {}, {}".format(deploy_journal_path, e))
+
+
+def persist_deploy_journal(folder: Path, deploy_journal: DeployJournal):
+    journal_dict = {"phase": deploy_journal.phase, "previous_deployed_mods": deploy_journal.previous_deployed_mods,
+                    "deployed_mods": deploy_journal.deployed_mods,
+                    "operations": [[operation.path, _entry_to_list(operation.old), _entry_to_list(operation.new)]
+                                   for operation in deploy_journal.operations]}
+    write_json_atomically(folder / DEPLOY_JOURNAL_FILENAME, journal_dict, separators=(",", ":"))
+
+
+def remove_deploy_journal(folder: Path):
+    os.remove(str(folder / DEPLOY_JOURNAL_FILENAME))
@@ -0,0 +1,17 @@
+from typing import Dict, List, NamedTuple
+
+DeployPlan = NamedTuple("DeployPlan", [("added", List[str]), ("removed", List[str]), ("changed", List[str])])
+
+# The file a path relative to the game folder is deployed from, the winning mod and its blob
+PlannedFile = NamedTuple("PlannedFile", [("mod", str), ("hash", str), ("size", int)])
+
+FilePlan = Dict[str, PlannedFile]
+
+
+def plan_deployment(deployed_files: Dict[str, str], desired_files: Dict[str, str]) -> DeployPlan:
+    # Both arguments map a path relative to the game folder to the name of the mod owning it
+    added = [path for path in desired_files if path not in deployed_files]
+    removed = [path for path in deployed_files if path not in desired_files]
+    changed = [path for path, owner in desired_files.items()
+               if path in deployed_files and deployed_files[path] != owner]
+    return DeployPlan(added=sorted(added), removed=sorted(removed), changed=sorted(changed))
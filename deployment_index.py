@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+from atomic_file import write_json_atomically
+
+DeployedFile = NamedTuple("DeployedFile", [("mod", str), ("hash", str), ("size", int), ("mtime_ns", int),
+                                           ("backed_up", bool)])
+
+DeploymentIndex = Dict[str, DeployedFile]
+
+DEPLOYMENT_INDEX_FILENAME = "deployment_index.json"
+DEPLOYMENT_INDEX_VERSION = 1
+
+
+def deployment_index_exists(folder: Path) -> bool:
+    return (folder / DEPLOYMENT_INDEX_FILENAME).is_file()
+
+
+def load_deployment_index(folder: Path) -> DeploymentIndex:
+    deployment_index_path = folder / DEPLOYMENT_INDEX_FILENAME
+    if not deployment_index_path.is_file():
+        return {}
+    try:
+        with open(str(deployment_index_path), "r") as index_in_file:
+            index_dict = json.load(index_in_file)
+            if index_dict["version"] != DEPLOYMENT_INDEX_VERSION:
+                raise ValueError("Unknown deployment index version {}".format(index_dict["version"]))
+            return {path: DeployedFile(*entry) for path, entry in index_dict["files"].items()}
+    except (KeyError, TypeError, ValueError) as e:
+        raise RuntimeError("Corrupt deployment index {}, {}".format(deployment_index_path, e))
+
+
+def persist_deployment_index(folder: Path, deployment_index: DeploymentIndex):
+    index_dict = {"version": DEPLOYMENT_INDEX_VERSION,
+                  "files": {path: list(entry) for path, entry in sorted(deployment_index.items())}}
+    write_json_atomically(folder / DEPLOYMENT_INDEX_FILENAME, index_dict, separators=(",", ":"))
@@ -0,0 +1,210 @@
+from abc import ABC, abstractmethod
+import ctypes
+import ctypes.util
+import errno
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import threading
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+DEFAULT_POLLING_INTERVAL = 5.0
+
+# False when events were lost, e.g. the inotify queue overflowed, then everything has to be revalidated
+DirtyPaths = NamedTuple("DirtyPaths", [("paths", Set[Path]), ("complete", bool)])
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCHED_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+                 IN_DELETE_SELF | IN_MOVE_SELF
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FolderWatcher(ABC):
+    # Collects the paths changed under the roots since the dirty paths were last taken
+    def __init__(self, roots: List[Path]):
+        self.roots = roots
+        self._lock = threading.Lock()
+        self._dirty_paths = set()
+        self._complete = True
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def take_dirty_paths(self) -> DirtyPaths:
+        with self._lock:
+            dirty_paths = DirtyPaths(paths=self._dirty_paths, complete=self._complete)
+            self._dirty_paths = set()
+            self._complete = True
+        return dirty_paths
+
+    def _mark_dirty(self, path: Path):
+        with self._lock:
+            self._dirty_paths.add(path)
+
+    def _mark_incomplete(self):
+        with self._lock:
+            self._complete = False
+
+    @abstractmethod
+    def _run(self):
+        pass
+
+
+class PollingWatcher(FolderWatcher):
+    def __init__(self, roots: List[Path], polling_interval: float = DEFAULT_POLLING_INTERVAL):
+        super().__init__(roots)
+        self.polling_interval = polling_interval
+        self._snapshot = self._take_snapshot()
+
+    def poll(self):
+        snapshot = self._take_snapshot()
+        for path in snapshot.keys() | self._snapshot.keys():
+            if snapshot.get(path) != self._snapshot.get(path):
+                self._mark_dirty(path)
+        self._snapshot = snapshot
+
+    def _run(self):
+        while not self._stopped.wait(self.polling_interval):
+            self.poll()
+
+    def _take_snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        directories = [str(root) for root in self.roots if root.is_dir()]
+        while directories:
+            try:
+                with os.scandir(directories.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        else:
+                            entry_stat = entry.stat(follow_symlinks=False)
+                            snapshot[Path(entry.path)] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+            except FileNotFoundError:
+                # Removed while it was scanned, the next poll sees it gone
+                continue
+        return snapshot
+
+
+class InotifyWatcher(FolderWatcher):
+    def __init__(self, roots: List[Path]):
+        super().__init__(roots)
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched_folders = {}
+        try:
+            for root in roots:
+                if root.is_dir():
+                    self._watch_tree(root)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def stop(self):
+        super().stop()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _watch_tree(self, root: Path) -> List[Path]:
+        # Watches every folder under root, and returns the files found, which appeared before the watches existed
+        files = []
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), WATCHED_EVENTS)
+            if watch_descriptor < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue
+                raise OSError(error, "Could not watch {}, {}".format(directory, os.strerror(error)))
+            self._watched_folders[watch_descriptor] = directory
+            try:
+                with os.scandir(str(directory)) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(Path(entry.path))
+                        else:
+                            files.append(Path(entry.path))
+            except FileNotFoundError:
+                continue
+        return files
+
+    def _run(self):
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([self._fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._handle_events(buffer)
+
+    def _handle_events(self, buffer: bytes):
+        offset = 0
+        while offset < len(buffer):
+            watch_descriptor, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                self._mark_incomplete()
+                continue
+            folder = self._watched_folders.get(watch_descriptor)
+            if mask & IN_IGNORED:
+                self._watched_folders.pop(watch_descriptor, None)
+                continue
+            if folder is None:
+                continue
+            path = folder / os.fsdecode(name) if name else folder
+            self._mark_dirty(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    for file in self._watch_tree(path):
+                        self._mark_dirty(file)
+                except OSError:
+                    # Most likely out of watches, from now on changes may be missed
+                    self._mark_incomplete()
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def create_folder_watcher(roots: List[Path], use_inotify: bool = True,
+                          polling_interval: float = DEFAULT_POLLING_INTERVAL) -> FolderWatcher:
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError):
+            # No inotify in this libc, or not enough watches for the trees
+            pass
+    return PollingWatcher(roots, polling_interval)
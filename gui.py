@@ -1,165 +1,29 @@
-from distutils.dir_util import copy_tree
-import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import patoolib
-import re
 import tkinter
 import tkinter.messagebox
 import tkinter.filedialog
 import tkinter.font
 import tkinter.simpledialog
+import tkinter.ttk
 import tempfile
-from typing import Dict, List
-import shutil
-from master_manifest import load_master_manifest, persist_master_manifest
+from typing import Callable, Dict, List, Tuple
+from archive_import import is_zip_archive
+from model import MainWindowModel
+from progress import OperationCancelled, OperationProgress
+
+PROGRESS_POLL_INTERVAL_MS = 100
 
 
 def start_gui(configuration: Dict, mod_manager_folder: str, game_folder: str):
     model = MainWindowModel(configuration, mod_manager_folder, game_folder)
+    if configuration.get("folder_watcher", "off") != "off":
+        model.start_watching()
     root = tkinter.Tk()
     MainWindow(model=model, master=root)
     root.mainloop()
 
 
-class MainWindowModel:
-    MOD_CONTENT_SUBFOLDER_NAME = "_mod_contents"
-
-    def __init__(self, configuration: Dict, mod_manager_folder: str, game_folder: str):
-        self.mod_manager_folder = Path(mod_manager_folder)
-        self.managed_mods_folder = self.mod_manager_folder / "managed_mods"
-        self.mod_staging_folder = self.mod_manager_folder / "mod_staging"
-        self.original_data_backup_folder = self.mod_manager_folder / "original_data_backup"
-
-        self._ensure_directory_exists(self.managed_mods_folder)
-        self._ensure_directory_exists(self.mod_staging_folder)
-        self._ensure_directory_exists(self.original_data_backup_folder)
-
-        self.game_folder = Path(game_folder)
-        self.configuration = configuration
-        self.master_manifest = load_master_manifest(self.mod_manager_folder)
-
-    @staticmethod
-    def _ensure_directory_exists(directory: Path):
-        if not directory.is_dir():
-            directory.mkdir()
-
-    def get_managed_mod_names(self):
-        return [content.name for content in self.managed_mods_folder.iterdir() if content.is_dir()]
-
-    def get_active_mod_names(self):
-        return self.master_manifest.active_mods
-
-    def get_deployed_mod_names(self):
-        return self.master_manifest.deployed_mods
-
-    def add_mod(self, mod_name: str, mod_content_folder: Path):
-        new_mod_folder = self.managed_mods_folder / mod_name
-        if new_mod_folder.is_file() or new_mod_folder.is_dir():
-            raise RuntimeError("There is a managed mod called '{}' already".format(mod_name))
-
-        new_mod_content_folder = new_mod_folder / self.MOD_CONTENT_SUBFOLDER_NAME / mod_content_folder.name
-        shutil.copytree(str(mod_content_folder), str(new_mod_content_folder), dirs_exist_ok=True)
-
-    def activate_mod(self, mod_name: str):
-        assert mod_name not in self.get_active_mod_names(), "Mod already active"
-        mod_folder = self.managed_mods_folder / mod_name
-        assert mod_folder.is_dir(), "Mod is not managed"
-
-        self.master_manifest.active_mods.append(mod_name)
-        persist_master_manifest(self.mod_manager_folder, self.master_manifest)
-
-    def deactivate_mod(self, mod_name: str):
-        assert mod_name in self.get_active_mod_names(), "Mod not active"
-        mod_folder = self.managed_mods_folder / mod_name
-        assert mod_folder.is_dir(), "Mod is not managed"
-
-        self.master_manifest.active_mods.remove(mod_name)
-        persist_master_manifest(self.mod_manager_folder, self.master_manifest)
-
-    def deploy_mods(self):
-        self._restore_untouched_game_folder()
-
-        for active_mod_name in self.get_active_mod_names():
-            active_mod_content_folder = self.managed_mods_folder / active_mod_name / self.MOD_CONTENT_SUBFOLDER_NAME
-            try:
-                shutil.copytree(str(active_mod_content_folder), str(self.mod_staging_folder), dirs_exist_ok=True)
-            except Exception as e:
-                raise RuntimeError(e)
-
-        files_to_copy = copy_tree(str(self.mod_staging_folder), str(self.game_folder), dry_run=True)
-        try:
-            self._create_backup(files_to_copy)
-            copy_tree(str(self.mod_staging_folder), str(self.game_folder))
-        except Exception as e:
-            shutil.rmtree(str(self.mod_staging_folder))
-            self._ensure_directory_exists(self.mod_staging_folder)
-            raise RuntimeError(e)
-
-        self.master_manifest.deployed_mods.clear()
-        self.master_manifest.deployed_mods.extend(self.get_active_mod_names())
-        persist_master_manifest(self.mod_manager_folder, self.master_manifest)
-
-    def _create_backup(self, files_to_be_deployed: List[str]):
-        files_to_backup = [Path(file) for file in files_to_be_deployed if Path(file).is_file()]
-        for file_to_backup in files_to_backup:
-            relative_path_of_file_to_backup = file_to_backup.relative_to(self.game_folder)
-            backup_destination = self.original_data_backup_folder / relative_path_of_file_to_backup
-            backup_destination.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copyfile(str(file_to_backup), str(backup_destination))
-
-    def _restore_untouched_game_folder(self):
-        all_deployed_contents = [*self.mod_staging_folder.rglob("*")]
-        for deployed_content in all_deployed_contents:
-            deployed_target_path = self.game_folder / deployed_content.relative_to(self.mod_staging_folder)
-            if deployed_target_path.is_file():
-                os.remove(str(deployed_target_path))
-
-        all_backup_contents = [*self.original_data_backup_folder.rglob("*")]
-        for backup_content in all_backup_contents:
-            if backup_content.is_file():
-                restore_destination = self.game_folder / backup_content.relative_to(self.original_data_backup_folder)
-                shutil.copy(str(backup_content), str(restore_destination))
-
-        shutil.rmtree(str(self.mod_staging_folder))
-        shutil.rmtree(str(self.original_data_backup_folder))
-        self._ensure_directory_exists(self.mod_staging_folder)
-        self._ensure_directory_exists(self.original_data_backup_folder)
-
-    def find_or_create_mod_content_folder(self, mod_archive_contents_folder: str) -> Path:
-        mod_archive_contents_folder_path = Path(mod_archive_contents_folder)
-        all_contents = [*mod_archive_contents_folder_path.glob("**/*")]
-        moddable_folders = self.configuration["moddable_folders"]
-
-        mod_content_folders = [content for content in all_contents if
-                               content.is_dir() and content.name in moddable_folders]
-        if len(mod_content_folders) == 1:
-            return mod_content_folders[0]
-        else:
-            # Not a top level moddable folder, try if it's a hero skin
-            for content in all_contents:
-                if content.is_dir():
-                    match = re.fullmatch(r"([\w_]+)_[a-zA-Z]", content.name)
-                    if match:
-                        hero_name = match.group(1)
-                        content_folder_path = mod_archive_contents_folder_path / "heroes" / hero_name
-                        heroes_contents = [*content.parent.rglob("*")]
-                        for heroes_content in heroes_contents:
-                            if heroes_content.is_file():
-                                mod_content_destination = content_folder_path / heroes_content.relative_to(
-                                    content.parent)
-                                try:
-                                    mod_content_destination.parent.mkdir(parents=True, exist_ok=True)
-                                    shutil.copyfile(str(heroes_content), str(mod_content_destination))
-                                except Exception as e:
-                                    raise RuntimeError(e)
-                        mod_content_folder = content_folder_path.parent
-                        break
-            else:
-                raise RuntimeError("Could not find mod content in archive")
-
-        return mod_content_folder
-
-
 class MainWindow(tkinter.Frame):
     def __init__(self, model: MainWindowModel, master=None):
         super().__init__(master)
@@ -171,40 +35,92 @@ class MainWindow(tkinter.Frame):
         self.selected_managed_mod = None
         self.selected_activated_mod = None
 
+        # Model operations which touch files run on this single worker, one at a time, the Tk loop polls their progress
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model_operation")
+        self.running_operation = None
+
+        self.rendered_mod_registry_revision = None
+        self.rendered_managed_mod_rows = []
+        self.rendered_active_mod_rows = []
+
         self._create_widgets()
         self.pack(fill="both", expand=True)
 
         self._refresh()
 
     def _refresh(self):
-        managed_mods = self.model.get_managed_mod_names()
-        self.managed_mods_listvar.set(managed_mods)
-        active_mods = self.model.get_active_mod_names()
-        self.active_mods_listvar.set(active_mods)
-
-        for i, managed_mod in enumerate(managed_mods):
-            color = "pale green" if managed_mod in active_mods else "white"
-            self.managed_mods_listbox.itemconfig(i, {"bg": color})
-
-        deployed_mods = self.model.get_deployed_mod_names()
-        for i, active_mod in enumerate(active_mods):
-            color = "pale green" if active_mod in deployed_mods else "sky blue"
-            self.active_mods_listbox.itemconfig(i, {"bg": color})
+        # The mod lists only change with the mod registry, selecting a mod just updates the buttons
+        if self.rendered_mod_registry_revision != self.model.mod_registry_revision:
+            self._refresh_mod_lists()
+            self.rendered_mod_registry_revision = self.model.mod_registry_revision
 
+        # The mods can be browsed while an operation runs, but not changed
+        idle = self.running_operation is None
         activate_mod_button_state = "disabled"
-        if self.selected_managed_mod is not None and self.selected_managed_mod not in active_mods:
+        if idle and self.selected_managed_mod is not None and not self.model.is_mod_active(self.selected_managed_mod):
             activate_mod_button_state = "normal"
         self.activate_mod_button.config(state=activate_mod_button_state)
 
         deactivate_mod_button_state = "disabled"
-        if self.selected_activated_mod is not None:
+        if idle and self.selected_activated_mod is not None:
             deactivate_mod_button_state = "normal"
         self.deactivate_mod_button.config(state=deactivate_mod_button_state)
+        self.load_earlier_button.config(state=deactivate_mod_button_state)
+        self.load_later_button.config(state=deactivate_mod_button_state)
+
+        idle_button_state = "normal" if idle else "disabled"
+        self.add_mod_from_archive_button.config(state=idle_button_state)
+        self.add_mod_from_folder_button.config(state=idle_button_state)
+        self.deploy_mods_button.config(state=idle_button_state)
+        self.save_profile_button.config(state=idle_button_state)
+        self.switch_profile_button.config(state=idle_button_state if self.profile_var.get() else "disabled")
+        self.cancel_button.config(state="disabled" if idle else "normal")
+
+        if idle:
+            # The worker of a running operation changes the mod manifests, the last summary is shown until it is done
+            self.conflicts_label.config(text=self._describe_conflicts(self.selected_activated_mod))
+
+    def _refresh_mod_lists(self):
+        managed_mods = self.model.get_managed_mod_names()
+        active_mods = self.model.get_load_ordered_mod_names()
+        deployed_mods = self.model.get_deployed_mod_names()
+
+        self.rendered_managed_mod_rows = self._update_listbox_rows(
+            self.managed_mods_listbox, self.managed_mods_listvar, self.rendered_managed_mod_rows,
+            [(mod, "pale green" if self.model.is_mod_active(mod) else "white") for mod in managed_mods])
+        self.rendered_active_mod_rows = self._update_listbox_rows(
+            self.active_mods_listbox, self.active_mods_listvar, self.rendered_active_mod_rows,
+            [(mod, "pale green" if self.model.is_mod_deployed(mod) else "sky blue") for mod in active_mods])
+
+        self.deploy_mods_button.config(font=self.normal_font if deployed_mods == active_mods else self.bold_font)
 
-        deploy_button_font_weight = tkinter.font.NORMAL if set(deployed_mods) == set(active_mods) else tkinter.font.BOLD
-        deploy_button_font = tkinter.font.nametofont("TkDefaultFont").copy()
-        deploy_button_font.configure(weight=deploy_button_font_weight)
-        self.deploy_mods_button.config(font=deploy_button_font)
+        profile_names = self.model.get_profile_names()
+        self.profile_combobox.config(values=profile_names)
+        if self.profile_var.get() not in profile_names:
+            self.profile_var.set("")
+
+    @staticmethod
+    def _update_listbox_rows(listbox: tkinter.Listbox, listvar: tkinter.StringVar, rendered_rows: List[Tuple[str, str]],
+                             rows: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        # Rows are (mod name, colour), only the rows which differ from the rendered ones are recoloured
+        if [mod for mod, _ in rows] != [mod for mod, _ in rendered_rows]:
+            # Replacing the items resets their colours
+            listvar.set([mod for mod, _ in rows])
+            rendered_rows = []
+        for i, (mod, color) in enumerate(rows):
+            if i >= len(rendered_rows) or rendered_rows[i][1] != color:
+                listbox.itemconfig(i, {"bg": color})
+        return rows
+
+    def _describe_conflicts(self, mod_name) -> str:
+        conflicts = self.model.get_conflicts()
+        if mod_name is None:
+            return "{} conflicting mod pair(s)".format(len(conflicts))
+        overrides = ["{} ({} files)".format(overridden_mod, len(paths))
+                     for (overridden_mod, overriding_mod), paths in conflicts.items() if overriding_mod == mod_name]
+        overridden_by = ["{} ({} files)".format(overriding_mod, len(paths))
+                         for (overridden_mod, overriding_mod), paths in conflicts.items() if overridden_mod == mod_name]
+        return "Overrides: {}\nOverridden by: {}".format(", ".join(overrides) or "-", ", ".join(overridden_by) or "-")
 
     def _on_managed_mod_selected(self, evt):
         selected_listbox = evt.widget
@@ -225,6 +141,10 @@ class MainWindow(tkinter.Frame):
         return None
 
     def _create_widgets(self):
+        self.normal_font = tkinter.font.nametofont("TkDefaultFont").copy()
+        self.bold_font = tkinter.font.nametofont("TkDefaultFont").copy()
+        self.bold_font.configure(weight=tkinter.font.BOLD)
+
         self.managed_mods_frame = tkinter.Frame(self)
         self.managed_mods_title = tkinter.Label(self.managed_mods_frame, text="Managed mods")
         self.managed_mods_title.pack(side=tkinter.TOP)
@@ -251,6 +171,8 @@ class MainWindow(tkinter.Frame):
         self.active_mods_scrollbar.config(command=self.active_mods_listbox.yview)
         self.active_mods_scrollbar.pack(side=tkinter.RIGHT, fill="y")
         self.active_mods_listbox.config(yscrollcommand=self.active_mods_scrollbar.set)
+        self.conflicts_label = tkinter.Label(self.active_mods_frame, justify=tkinter.LEFT)
+        self.conflicts_label.pack(side=tkinter.BOTTOM, before=self.active_mods_listbox)
         self.active_mods_frame.pack(side=tkinter.RIGHT, fill="both", expand=True)
 
         self.buttons_frame = tkinter.Frame(self)
@@ -265,13 +187,99 @@ class MainWindow(tkinter.Frame):
         self.deactivate_mod_button = tkinter.Button(self.buttons_frame, text="Dectivate mod",
                                                     command=self._deactivate_mod)
         self.deactivate_mod_button.pack()
+        self.load_earlier_button = tkinter.Button(self.buttons_frame, text="Load earlier",
+                                                  command=lambda: self._move_mod_in_load_order(-1))
+        self.load_earlier_button.pack()
+        self.load_later_button = tkinter.Button(self.buttons_frame, text="Load later",
+                                                command=lambda: self._move_mod_in_load_order(1))
+        self.load_later_button.pack()
         self.deploy_mods_button = tkinter.Button(self.buttons_frame, text="Deploy mods",
                                                  command=self._deploy_mods)
         self.deploy_mods_button.pack()
-        self.quit_button = tkinter.Button(self.buttons_frame, text="Quit", command=self.master.destroy)
+        self.profile_var = tkinter.StringVar(self.buttons_frame)
+        self.profile_combobox = tkinter.ttk.Combobox(self.buttons_frame, textvariable=self.profile_var,
+                                                     state="readonly")
+        self.profile_combobox.bind("<<ComboboxSelected>>", lambda _: self._refresh())
+        self.profile_combobox.pack()
+        self.switch_profile_button = tkinter.Button(self.buttons_frame, text="Switch to profile",
+                                                    command=self._switch_profile)
+        self.switch_profile_button.pack()
+        self.save_profile_button = tkinter.Button(self.buttons_frame, text="Save as profile",
+                                                  command=self._save_profile)
+        self.save_profile_button.pack()
+        self.quit_button = tkinter.Button(self.buttons_frame, text="Quit", command=self._quit)
         self.quit_button.pack()
         self.buttons_frame.pack(side=tkinter.BOTTOM)
 
+        self.progress_frame = tkinter.Frame(self)
+        self.progress_label = tkinter.Label(self.progress_frame)
+        self.progress_label.pack()
+        self.progress_bar = tkinter.ttk.Progressbar(self.progress_frame, orient="horizontal", length=200)
+        self.progress_bar.pack()
+        self.cancel_button = tkinter.Button(self.progress_frame, text="Cancel", command=self._cancel_operation)
+        self.cancel_button.pack()
+        self.progress_frame.pack(side=tkinter.BOTTOM, before=self.buttons_frame)
+        self.master.protocol("WM_DELETE_WINDOW", self._quit)
+
+    def _run_operation(self, operation: Callable[[OperationProgress], object], on_success: Callable[[object], None],
+                       error_message: str):
+        assert self.running_operation is None, "Another operation is running"
+        progress = OperationProgress()
+        future = self.executor.submit(operation, progress)
+        self.running_operation = (future, progress, on_success, error_message)
+        self._refresh()
+        self.after(PROGRESS_POLL_INTERVAL_MS, self._poll_operation)
+
+    def _poll_operation(self):
+        future, progress, on_success, error_message = self.running_operation
+        self._show_progress(progress)
+        if not future.done():
+            self.after(PROGRESS_POLL_INTERVAL_MS, self._poll_operation)
+            return
+
+        self.running_operation = None
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate", value=0)
+        self.progress_label.config(text="")
+        self._refresh()
+        try:
+            result = future.result()
+        except OperationCancelled:
+            return
+        except Exception as e:
+            tkinter.messagebox.showerror("Error", error_message.format(e))
+            return
+        on_success(result)
+
+    def _show_progress(self, progress: OperationProgress):
+        snapshot = progress.snapshot()
+        if snapshot.files_total == 0:
+            # Extracting an archive, or rolling back, reports no totals
+            if str(self.progress_bar.cget("mode")) != "indeterminate":
+                self.progress_bar.config(mode="indeterminate")
+                self.progress_bar.start()
+            self.progress_label.config(text="{}...".format(snapshot.stage or "Working"))
+            return
+
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate", maximum=snapshot.bytes_total or snapshot.files_total,
+                                 value=snapshot.bytes_done if snapshot.bytes_total else snapshot.files_done)
+        self.progress_label.config(text="{}: {}/{} files, {:.1f}/{:.1f} MB".format(
+            "Cancelling" if progress.cancelled else snapshot.stage, snapshot.files_done, snapshot.files_total,
+            snapshot.bytes_done / 1e6, snapshot.bytes_total / 1e6))
+
+    def _cancel_operation(self):
+        if self.running_operation is not None:
+            self.running_operation[1].cancel()
+            self.cancel_button.config(state="disabled")
+
+    def _quit(self):
+        # A cancelled deploy still rolls back before the window closes
+        self._cancel_operation()
+        self.executor.shutdown(wait=True)
+        self.model.close()
+        self.master.destroy()
+
     def _add_mod_from_archive(self):
         file = tkinter.filedialog.askopenfilename(title="Open the archive containing the mod files",
                                                   filetypes=[("Archives (*.zip, *rar)", ".zip .rar")])
@@ -282,22 +290,41 @@ class MainWindow(tkinter.Frame):
             tkinter.messagebox.showwarning(title="File not found")
             return
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            patoolib.extract_archive(file, outdir=temp_dir)
-            try:
-                mod_content_folder = self.model.find_or_create_mod_content_folder(temp_dir)
-            except RuntimeError as e:
-                tkinter.messagebox.showerror("Error", "Could not determine mod content in archive, {}".format(e))
-                return
-            mod_name = tkinter.simpledialog.askstring("Input the name of the mod", "Mod name",
-                                                      initialvalue=Path(file).stem)
-            try:
-                self.model.add_mod(mod_name, mod_content_folder)
-            except RuntimeError as e:
-                tkinter.messagebox.showerror("Error", str(e))
-                return
+        if is_zip_archive(Path(file)):
+            self._add_mod_from_zip(Path(file))
+            return
 
-        self._refresh()
+        # Lives until the mod is added from it
+        temp_dir = tempfile.TemporaryDirectory()
+
+        def extract_archive(progress: OperationProgress) -> Path:
+            import patoolib
+            try:
+                progress.start_stage("Extracting {}".format(Path(file).name))
+                patoolib.extract_archive(file, outdir=temp_dir.name)
+                return self.model.find_or_create_mod_content_folder(temp_dir.name, progress)
+            except BaseException:
+                temp_dir.cleanup()
+                raise
+
+        self._run_operation(extract_archive,
+                            lambda mod_content_folder: self._add_mod_from_content_folder(
+                                mod_content_folder, Path(file).stem, temp_dir.cleanup),
+                            "Could not determine mod content in archive, {}")
+
+    def _add_mod_from_zip(self, archive_path: Path):
+        try:
+            content_root = self.model.find_zip_mod_content(archive_path)
+        except RuntimeError as e:
+            tkinter.messagebox.showerror("Error", "Could not determine mod content in archive, {}".format(e))
+            return
+        mod_name = tkinter.simpledialog.askstring("Input the name of the mod", "Mod name",
+                                                  initialvalue=archive_path.stem)
+        if not mod_name:
+            return
+        self._run_operation(lambda progress: self.model.add_mod_from_zip(mod_name, archive_path, content_root,
+                                                                         progress),
+                            lambda _: None, "{}")
 
     def _add_mod_from_folder(self):
         folder = tkinter.filedialog.askdirectory(title="Select the folder containing the mod files")
@@ -308,20 +335,26 @@ class MainWindow(tkinter.Frame):
             tkinter.messagebox.showwarning(title="Folder not found")
             return
 
-        try:
-            mod_content_folder = self.model.find_or_create_mod_content_folder(folder)
-        except RuntimeError as e:
-            tkinter.messagebox.showerror("Error", "Could not determine mod content in archive, {}".format(e))
-            return
+        self._run_operation(lambda progress: self.model.find_or_create_mod_content_folder(folder, progress),
+                            lambda mod_content_folder: self._add_mod_from_content_folder(mod_content_folder,
+                                                                                        Path(folder).name),
+                            "Could not determine mod content in archive, {}")
+
+    def _add_mod_from_content_folder(self, mod_content_folder: Path, default_mod_name: str,
+                                     on_done: Callable[[], None] = lambda: None):
         mod_name = tkinter.simpledialog.askstring("Input the name of the mod", "Mod name",
-                                                  initialvalue=Path(folder).name)
-        try:
-            self.model.add_mod(mod_name, mod_content_folder)
-        except RuntimeError as e:
-            tkinter.messagebox.showerror("Error", str(e))
+                                                  initialvalue=default_mod_name)
+        if not mod_name:
+            on_done()
             return
 
-        self._refresh()
+        def add_mod(progress: OperationProgress):
+            try:
+                self.model.add_mod(mod_name, mod_content_folder, progress)
+            finally:
+                on_done()
+
+        self._run_operation(add_mod, lambda _: None, "{}")
 
     def _activate_mod(self):
         assert self.selected_managed_mod, "No managed mod selected"
@@ -341,9 +374,25 @@ class MainWindow(tkinter.Frame):
                                          "Could not activate mod {}, {}".format(self.selected_managed_mod, str(e)))
         self._refresh()
 
-    def _deploy_mods(self):
-        try:
-            self.model.deploy_mods()
-        except RuntimeError as e:
-            tkinter.messagebox.showerror("Error", "Could not deploy mods {}".format(str(e)))
+    def _move_mod_in_load_order(self, offset: int):
+        assert self.selected_activated_mod, "No activated mod selected"
+        self.model.move_mod_in_load_order(self.selected_activated_mod, offset)
+        self._refresh()
+
+    def _save_profile(self):
+        profile_name = tkinter.simpledialog.askstring("Save the active mods as a profile", "Profile name",
+                                                      initialvalue=self.profile_var.get())
+        if not profile_name:
+            return
+        self.model.save_profile(profile_name)
+        self.profile_var.set(profile_name)
         self._refresh()
+
+    def _switch_profile(self):
+        profile_name = self.profile_var.get()
+        assert profile_name, "No profile selected"
+        self._run_operation(lambda progress: self.model.switch_profile(profile_name, progress), lambda _: None,
+                            "Could not switch to profile " + profile_name + ", {}")
+
+    def _deploy_mods(self):
+        self._run_operation(self.model.deploy_mods, lambda _: None, "Could not deploy mods {}")
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+import json
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+INSTRUMENTATION_LOG_FILENAME = "instrumentation.jsonl"
+
+# Counter names used by the model and the blob store
+FILES = "files"
+BYTES_READ = "bytes_read"
+BYTES_WRITTEN = "bytes_written"
+STAT = "stat"
+MKDIR = "mkdir"
+LINK = "link"
+UNLINK = "unlink"
+
+PhaseRecord = NamedTuple("PhaseRecord", [("operation", str), ("phase", str), ("started", float), ("seconds", float),
+                                         ("counters", Dict[str, int])])
+
+
+class Instrumentation:
+    # Disabled until an observer is added or a log file is set, then every phase costs a context manager and a check
+    def __init__(self, log_path: Optional[Path] = None):
+        self._log_path = log_path
+        self._observers = []
+        self._lock = threading.Lock()
+        # Counters of the innermost open phase, counted from any thread, e.g. the copy engine workers
+        self._open_phase_counters = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._observers) or self._log_path is not None
+
+    def add_observer(self, observer: Callable[[PhaseRecord], None]):
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Callable[[PhaseRecord], None]):
+        self._observers.remove(observer)
+
+    @contextmanager
+    def phase(self, operation: str, phase: str):
+        if not self.enabled:
+            yield
+            return
+
+        counters = {}
+        with self._lock:
+            self._open_phase_counters.append(counters)
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._open_phase_counters.remove(counters)
+            self._publish(PhaseRecord(operation=operation, phase=phase, started=started, seconds=seconds,
+                                      counters=counters))
+
+    def count(self, counter: str, amount: int = 1):
+        if not self._open_phase_counters:
+            return
+        with self._lock:
+            if self._open_phase_counters:
+                counters = self._open_phase_counters[-1]
+                counters[counter] = counters.get(counter, 0) + amount
+
+    def _publish(self, phase_record: PhaseRecord):
+        for observer in list(self._observers):
+            observer(phase_record)
+        if self._log_path is not None:
+            with self._lock, open(str(self._log_path), "a") as log_file:
+                log_file.write(json.dumps(phase_record._asdict()) + "\n")
@@ -2,9 +2,11 @@ import argparse
 import json
 import os
 from pathlib import Path
+import sys
 
-from gui import start_gui
-from master_manifest import MasterManfiest
+from batch_import import collect_import_sources, derive_mod_name
+from model import MainWindowModel
+from verification import group_drift_by_mod
 
 
 def validate_command_line_arguments(arguments):
@@ -22,6 +24,184 @@ def parse_configuration():
         return configuration
 
 
+def list_mods(model: MainWindowModel, arguments):
+    active_mods = set(model.get_active_mod_names())
+    deployed_mods = set(model.get_deployed_mod_names())
+    return [{"name": mod_name, "active": mod_name in active_mods, "deployed": mod_name in deployed_mods}
+            for mod_name in sorted(model.get_managed_mod_names())]
+
+
+def get_status(model: MainWindowModel, arguments):
+    return {"managed_mods": len(model.get_managed_mod_names()),
+            "active_mods": model.get_active_mod_names(),
+            "deployed_mods": model.get_deployed_mod_names(),
+            "deployed_files": len(model.deployment_index),
+            "deploy_needed": model.get_load_ordered_mod_names() != model.get_deployed_mod_names()}
+
+
+def add_mod(model: MainWindowModel, arguments):
+    mod_name = arguments.name or derive_mod_name(arguments.source)
+    model.add_mod_from_path(mod_name, arguments.source)
+    return {"added": mod_name}
+
+
+def activate_mods(model: MainWindowModel, arguments):
+    for mod_name in arguments.mod_names:
+        model.activate_mod(mod_name)
+    return {"active_mods": model.get_active_mod_names()}
+
+
+def deactivate_mods(model: MainWindowModel, arguments):
+    for mod_name in arguments.mod_names:
+        model.deactivate_mod(mod_name)
+    return {"active_mods": model.get_active_mod_names()}
+
+
+def deploy_mods(model: MainWindowModel, arguments):
+    model.deploy_mods()
+    return {"deployed_mods": model.get_deployed_mod_names(), "deployed_files": len(model.deployment_index)}
+
+
+def list_conflicts(model: MainWindowModel, arguments):
+    return [{"overridden": overridden_mod, "overriding": overriding_mod, "paths": paths}
+            for (overridden_mod, overriding_mod), paths in model.get_conflicts().items()]
+
+
+def set_load_order(model: MainWindowModel, arguments):
+    if arguments.mod_names:
+        model.set_load_order(arguments.mod_names)
+    return {"load_order": model.get_load_ordered_mod_names()}
+
+
+def list_profiles(model: MainWindowModel, arguments):
+    return {name: model.get_profile(name).active_mods for name in model.get_profile_names()}
+
+
+def save_profile(model: MainWindowModel, arguments):
+    model.save_profile(arguments.profile_name)
+    return {"saved": arguments.profile_name, "active_mods": model.get_profile(arguments.profile_name).active_mods}
+
+
+def switch_profile(model: MainWindowModel, arguments):
+    model.switch_profile(arguments.profile_name)
+    return {"deployed_mods": model.get_deployed_mod_names(), "deployed_files": len(model.deployment_index)}
+
+
+def delete_profile(model: MainWindowModel, arguments):
+    model.delete_profile(arguments.profile_name)
+    return {"deleted": arguments.profile_name}
+
+
+def verify_deployment(model: MainWindowModel, arguments):
+    verification_report = model.verify_deployment(full=arguments.full)
+    result = {"checked": verification_report.checked, "hashed": verification_report.hashed,
+              "drift": {mod_name: [{"path": drifted_file.path, "reason": drifted_file.reason}
+                                   for drifted_file in drifted_files]
+                        for mod_name, drifted_files in group_drift_by_mod(verification_report).items()}}
+    if arguments.repair:
+        result["repaired"] = model.repair_drifted_files(verification_report)
+    return result
+
+
+def import_mods(model: MainWindowModel, arguments):
+    sources = []
+    for source in arguments.sources:
+        sources.extend(collect_import_sources(source) if arguments.library else [source])
+    return model.import_mods(sources)._asdict()
+
+
+def export_mods(model: MainWindowModel, arguments):
+    return model.export_mods(arguments.bundle_folder, arguments.mod_names)._asdict()
+
+
+def import_bundle(model: MainWindowModel, arguments):
+    return model.import_bundle(arguments.bundle_folder)._asdict()
+
+
+def run_command(arguments, configuration) -> int:
+    model = None
+    try:
+        # Loading the state can fail too, e.g. on a corrupt index or an interrupted deploy which can't be recovered
+        model = MainWindowModel(configuration, mod_manager_folder=arguments.manager_folder,
+                                game_folder=arguments.game_steam_folder)
+        result = arguments.command_function(model, arguments)
+    except Exception as e:
+        # Also the errors of the archive tools and the file system, the output stays JSON
+        print(json.dumps({"error": str(e)}, indent=2))
+        return 1
+    finally:
+        if model is not None:
+            model.close()
+    print(json.dumps(result, indent=2))
+    return 1 if isinstance(result, dict) and result.get("failed") else 0
+
+
+def add_command_parsers(argument_parser: argparse.ArgumentParser):
+    subparsers = argument_parser.add_subparsers(dest="command", help="Run a command and print its result as JSON "
+                                                                     "instead of starting the GUI")
+    subparsers.add_parser("list", help="List the managed mods").set_defaults(command_function=list_mods)
+    subparsers.add_parser("status", help="Show the active and deployed mods").set_defaults(command_function=get_status)
+
+    add_parser = subparsers.add_parser("add", help="Add a mod from an archive or folder")
+    add_parser.add_argument("source", type=Path, help="The archive or folder containing the mod files")
+    add_parser.add_argument("-n", "--name", help="The name of the mod, defaults to the archive or folder name")
+    add_parser.set_defaults(command_function=add_mod)
+
+    activate_parser = subparsers.add_parser("activate", help="Activate managed mods, without deploying them")
+    activate_parser.add_argument("mod_names", nargs="+")
+    activate_parser.set_defaults(command_function=activate_mods)
+
+    deactivate_parser = subparsers.add_parser("deactivate", help="Deactivate active mods, without deploying")
+    deactivate_parser.add_argument("mod_names", nargs="+")
+    deactivate_parser.set_defaults(command_function=deactivate_mods)
+
+    subparsers.add_parser("deploy", help="Deploy the active mods to the game folder").set_defaults(
+        command_function=deploy_mods)
+
+    subparsers.add_parser("conflicts", help="List the files the active mods override of each other").set_defaults(
+        command_function=list_conflicts)
+
+    load_order_parser = subparsers.add_parser("load-order", help="Show the load order of the active mods, or set it. "
+                                                                 "Later mods override the files of earlier ones")
+    load_order_parser.add_argument("mod_names", nargs="*")
+    load_order_parser.set_defaults(command_function=set_load_order)
+
+    import_parser = subparsers.add_parser("import", help="Import many archives and folders at once, naming each mod "
+                                                         "after its archive or folder")
+    import_parser.add_argument("sources", nargs="+", type=Path, help="Archives and folders to import")
+    import_parser.add_argument("-l", "--library", action="store_true",
+                               help="Treat the sources as folders of mods, and import every archive and folder in them")
+    import_parser.set_defaults(command_function=import_mods)
+
+    export_parser = subparsers.add_parser("export", help="Export managed mods into a bundle folder, copying only the "
+                                                         "files the bundle does not have yet")
+    export_parser.add_argument("bundle_folder", type=Path)
+    export_parser.add_argument("mod_names", nargs="*", help="The mods to export, defaults to every managed mod")
+    export_parser.set_defaults(command_function=export_mods)
+
+    import_bundle_parser = subparsers.add_parser("import-bundle", help="Import the mods of a bundle folder, fetching "
+                                                                       "only the files which are not stored yet")
+    import_bundle_parser.add_argument("bundle_folder", type=Path)
+    import_bundle_parser.set_defaults(command_function=import_bundle)
+
+    subparsers.add_parser("profiles", help="List the profiles and their mods").set_defaults(
+        command_function=list_profiles)
+    for command, command_function, help_text in [
+            ("save-profile", save_profile, "Save the active mods and their load order as a profile"),
+            ("switch-profile", switch_profile, "Activate and deploy the mods of a profile"),
+            ("delete-profile", delete_profile, "Delete a profile")]:
+        profile_parser = subparsers.add_parser(command, help=help_text)
+        profile_parser.add_argument("profile_name")
+        profile_parser.set_defaults(command_function=command_function)
+
+    verify_parser = subparsers.add_parser("verify", help="Check that the deployed files match the mods and backups")
+    verify_parser.add_argument("--full", action="store_true",
+                               help="Hash every deployed file, not only the ones whose size or modification time "
+                                    "changed")
+    verify_parser.add_argument("--repair", action="store_true", help="Deploy the drifted files again")
+    verify_parser.set_defaults(command_function=verify_deployment)
+
+
 if __name__ == "__main__":
     argument_parser = argparse.ArgumentParser()
 
@@ -32,9 +212,15 @@ if __name__ == "__main__":
                                                                 "and intermediate files. Don't manually edit the "
                                                                 "contents within, and keep this argument constant "
                                                                 "across multiple invocations", required=True, type=Path)
+    add_command_parsers(argument_parser)
     arguments = argument_parser.parse_args()
     validate_command_line_arguments(arguments)
     configuration = parse_configuration()
 
-    start_gui(configuration=configuration, mod_manager_folder=arguments.manager_folder,
-              game_folder=arguments.game_steam_folder)
+    if arguments.command is not None:
+        sys.exit(run_command(arguments, configuration))
+    else:
+        # Only the GUI needs tkinter, don't pay for loading it when running a command
+        from gui import start_gui
+        start_gui(configuration=configuration, mod_manager_folder=arguments.manager_folder,
+                  game_folder=arguments.game_steam_folder)
@@ -1,33 +1,171 @@
 import json
 import os
 from pathlib import Path
-from typing import List, NamedTuple
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
 
-MasterManfiest = NamedTuple("MasterManfiest", [("active_mods", List[str]), ("deployed_mods", List[str])])
+from atomic_file import write_json_atomically
 
 MASTER_MANIFEST_FILENAME = "master_manifest.json"
+# 1: unversioned, load_order may be missing. 2: versioned, keys unknown to this version are kept as they are.
+MASTER_MANIFEST_VERSION = 2
+DEFAULT_WRITE_DELAY = 1.0
+KNOWN_KEYS = ["version", "active_mods", "deployed_mods", "load_order"]
 
 
-def load_master_manifest(folder: Path) -> MasterManfiest:
+class OrderedModSet:
+    # Mod names in insertion order, with constant time membership checks, adding and removing
+    def __init__(self, mod_names: Iterable[str] = ()):
+        self._mod_names = dict.fromkeys(mod_names)
+        self._list = None
+
+    def __contains__(self, mod_name) -> bool:
+        return mod_name in self._mod_names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._mod_names)
+
+    def __len__(self) -> int:
+        return len(self._mod_names)
+
+    def __eq__(self, other) -> bool:
+        return self.as_list() == list(other)
+
+    def __repr__(self) -> str:
+        return "OrderedModSet({})".format(self.as_list())
+
+    def add(self, mod_name: str):
+        self._mod_names[mod_name] = None
+        self._list = None
+
+    def remove(self, mod_name: str):
+        del self._mod_names[mod_name]
+        self._list = None
+
+    def replace(self, mod_names: Iterable[str]):
+        self._mod_names = dict.fromkeys(mod_names)
+        self._list = None
+
+    def as_list(self) -> List[str]:
+        # Cached until the next change, don't modify it
+        if self._list is None:
+            self._list = list(self._mod_names)
+        return self._list
+
+
+class MasterManfiest:
+    # The active and deployed mods and the load order, kept in memory. Mods later in the load order override the files
+    # of earlier ones, active mods missing from it load last. Changes are written together after the write delay, or
+    # right away when flushed.
+    def __init__(self, folder: Path, active_mods: Iterable[str] = (), deployed_mods: Iterable[str] = (),
+                 load_order: Iterable[str] = (), other_state: Optional[Dict] = None,
+                 write_delay: float = DEFAULT_WRITE_DELAY):
+        self.folder = folder
+        self.active_mods = OrderedModSet(active_mods)
+        self.deployed_mods = OrderedModSet(deployed_mods)
+        self.load_order = OrderedModSet(load_order)
+        # Written by other versions, kept as it is
+        self.other_state = other_state or {}
+        self.write_delay = write_delay
+        # Bumped by every change, lets callers cache what they derive from the manifest
+        self.revision = 0
+        self._persisted_revision = 0
+        self._lock = threading.RLock()
+        self._write_timer = None
+
+    def activate_mod(self, mod_name: str):
+        with self._lock:
+            self.active_mods.add(mod_name)
+            self._changed()
+
+    def deactivate_mod(self, mod_name: str):
+        with self._lock:
+            self.active_mods.remove(mod_name)
+            self._changed()
+
+    def set_active_mods(self, mod_names: Iterable[str]):
+        with self._lock:
+            self.active_mods.replace(mod_names)
+            self._changed()
+
+    def set_deployed_mods(self, mod_names: Iterable[str]):
+        with self._lock:
+            self.deployed_mods.replace(mod_names)
+            self._changed()
+
+    def set_load_order(self, mod_names: Iterable[str]):
+        with self._lock:
+            self.load_order.replace(mod_names)
+            self._changed()
+
+    def flush(self):
+        with self._lock:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+            if self._persisted_revision != self.revision:
+                persist_master_manifest(self.folder, self)
+                self._persisted_revision = self.revision
+
+    def _changed(self):
+        self.revision += 1
+        if self.write_delay <= 0:
+            self.flush()
+        elif self._write_timer is None:
+            # Every change until the timer fires is written at once
+            self._write_timer = threading.Timer(self.write_delay, self.flush)
+            self._write_timer.daemon = True
+            self._write_timer.start()
+
+
+def load_master_manifest(folder: Path, write_delay: float = DEFAULT_WRITE_DELAY) -> MasterManfiest:
     master_manifest_path = folder / MASTER_MANIFEST_FILENAME
     if not master_manifest_path.is_file():
-        master_manifest = MasterManfiest(active_mods=[], deployed_mods=[])
+        master_manifest = MasterManfiest(folder, write_delay=write_delay)
         persist_master_manifest(folder, master_manifest)
-    else:
-        try:
-            with open(str(master_manifest_path), "r") as manifest_in_file:
-                manifest_dict = json.load(manifest_in_file)
-                master_manifest = MasterManfiest(**manifest_dict)
-        except TypeError as e:
-            print("Error, corrupt master manifest. Removing and creating a new one.")
-            os.remove(str(master_manifest_path))
-            master_manifest = MasterManfiest(active_mods=[], deployed_mods=[])
-            persist_master_manifest(folder, master_manifest)
+        return master_manifest
 
-    return master_manifest
+    try:
+        with open(str(master_manifest_path), "r") as manifest_in_file:
+            manifest_dict = json.load(manifest_in_file)
+        manifest_dict = _migrate_master_manifest(manifest_dict)
+        if manifest_dict["version"] > MASTER_MANIFEST_VERSION:
+            raise RuntimeError("Master manifest {} was written by a newer version of the skin manager".format(
+                master_manifest_path))
+        return MasterManfiest(folder, active_mods=_read_mod_names(manifest_dict, "active_mods"),
+                              deployed_mods=_read_mod_names(manifest_dict, "deployed_mods"),
+                              load_order=_read_mod_names(manifest_dict, "load_order"),
+                              other_state={key: value for key, value in manifest_dict.items() if key not in KNOWN_KEYS},
+                              write_delay=write_delay)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        # Kept for inspection instead of being removed
+        corrupt_manifest_path = master_manifest_path.with_name(MASTER_MANIFEST_FILENAME + ".corrupt")
+        print("Error, corrupt master manifest, {}. Moving it to {} and creating a new one.".format(
+            e, corrupt_manifest_path))
+        os.replace(str(master_manifest_path), str(corrupt_manifest_path))
+        master_manifest = MasterManfiest(folder, write_delay=write_delay)
+        persist_master_manifest(folder, master_manifest)
+        return master_manifest
+
+
+def _migrate_master_manifest(manifest_dict: Dict) -> Dict:
+    if "version" not in manifest_dict:
+        # Written before load orders were supported
+        manifest_dict.setdefault("load_order", [])
+        manifest_dict["version"] = 2
+    return manifest_dict
+
+
+def _read_mod_names(manifest_dict: Dict, key: str) -> List[str]:
+    mod_names = manifest_dict[key]
+    if not isinstance(mod_names, list) or not all(isinstance(mod_name, str) for mod_name in mod_names):
+        raise ValueError("{} is not a list of mod names".format(key))
+    return mod_names
 
 
 def persist_master_manifest(folder: Path, master_manifest: MasterManfiest):
-    master_manifest_path = folder / MASTER_MANIFEST_FILENAME
-    with open(str(master_manifest_path), "w") as manifest_out_file:
-        json.dump(master_manifest._asdict(), manifest_out_file)
+    manifest_dict = dict(master_manifest.other_state)
+    manifest_dict.update(version=MASTER_MANIFEST_VERSION, active_mods=master_manifest.active_mods.as_list(),
+                         deployed_mods=master_manifest.deployed_mods.as_list(),
+                         load_order=master_manifest.load_order.as_list())
+    write_json_atomically(folder / MASTER_MANIFEST_FILENAME, manifest_dict)
@@ -0,0 +1,93 @@
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import tempfile
+from typing import Dict, List, NamedTuple, Tuple
+
+from atomic_file import write_json_atomically
+from content_hash import new_hasher
+from mod_layout import is_safe_relative_path
+from mod_manifest import ModFile, ModManifest
+
+BUNDLE_MANIFEST_FILENAME = "bundle.json"
+BUNDLE_VERSION = 1
+BUNDLE_BLOBS_FOLDER_NAME = "blobs"
+CONTENT_HASH_PATTERN = re.compile("[0-9a-f]{{{}}}".format(new_hasher().digest_size * 2))
+UNSAFE_MOD_NAME_PATTERN = re.compile(r'[<>:"/\\|?*\x00]')
+
+# The manifests of the mods in a bundle, by mod name. The bundle stores the blobs they reference like the blob store,
+# once per content, so exporting into the same bundle again only adds the new content.
+BundleManifest = Dict[str, ModManifest]
+
+BundleTransfer = NamedTuple("BundleTransfer", [("mods", List[str]), ("skipped", List[Tuple[str, str]]),
+                                               ("blobs", int), ("bytes", int)])
+
+
+def load_bundle_manifest(bundle_folder: Path) -> BundleManifest:
+    bundle_manifest_path = bundle_folder / BUNDLE_MANIFEST_FILENAME
+    if not bundle_manifest_path.is_file():
+        return {}
+    try:
+        with open(str(bundle_manifest_path), "r") as bundle_in_file:
+            bundle_dict = json.load(bundle_in_file)
+            if bundle_dict["version"] != BUNDLE_VERSION:
+                raise ValueError("Unknown bundle version {}".format(bundle_dict["version"]))
+            return {mod_name: {path: ModFile(*entry) for path, entry in files.items()}
+                    for mod_name, files in bundle_dict["mods"].items()}
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise RuntimeError("Corrupt bundle manifest {}, {}".format(bundle_manifest_path, e))
+
+
+def validate_bundle_manifest(bundle_manifest: BundleManifest, moddable_folders: List[str]):
+    # Bundles come from other machines, nothing in them may point outside the managed mods or the moddable folders
+    for mod_name, mod_manifest in bundle_manifest.items():
+        if not mod_name or mod_name.strip() != mod_name or mod_name in (".", "..") or \
+                UNSAFE_MOD_NAME_PATTERN.search(mod_name):
+            raise RuntimeError("Unsafe mod name in bundle '{}'".format(mod_name))
+        for path, mod_file in mod_manifest.items():
+            path_parts = path.split("/")
+            if not is_safe_relative_path(path) or "\\" in path or ":" in path or "" in path_parts or \
+                    len(path_parts) < 2 or path_parts[0] not in moddable_folders:
+                raise RuntimeError("Unsafe path in bundle mod {} '{}'".format(mod_name, path))
+            if not isinstance(mod_file.hash, str) or not CONTENT_HASH_PATTERN.fullmatch(mod_file.hash) or \
+                    not isinstance(mod_file.size, int) or mod_file.size < 0:
+                raise RuntimeError("Invalid file in bundle mod {} '{}'".format(mod_name, path))
+
+
+def persist_bundle_manifest(bundle_folder: Path, bundle_manifest: BundleManifest):
+    bundle_dict = {"version": BUNDLE_VERSION,
+                   "mods": {mod_name: {path: [mod_file.hash, mod_file.size]
+                                       for path, mod_file in sorted(mod_manifest.items())}
+                            for mod_name, mod_manifest in sorted(bundle_manifest.items())}}
+    write_json_atomically(bundle_folder / BUNDLE_MANIFEST_FILENAME, bundle_dict, separators=(",", ":"))
+
+
+def bundle_blob_path(bundle_folder: Path, content_hash: str) -> Path:
+    return bundle_folder / BUNDLE_BLOBS_FOLDER_NAME / content_hash[:2] / content_hash[2:]
+
+
+def collect_missing_blobs(mod_manifests: List[ModManifest], has_blob) -> Dict[str, int]:
+    # The size of every referenced blob for which has_blob is False, each content only once
+    missing_blobs = {}
+    for mod_manifest in mod_manifests:
+        for mod_file in mod_manifest.values():
+            if mod_file.hash not in missing_blobs and not has_blob(mod_file.hash):
+                missing_blobs[mod_file.hash] = mod_file.size
+    return missing_blobs
+
+
+def copy_blob_to_bundle(blob_path: Path, bundle_folder: Path, content_hash: str):
+    # Copied next to its final place and renamed, a bundle never holds a partial blob under its hash
+    destination = bundle_blob_path(bundle_folder, content_hash)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=str(destination.parent))
+    os.close(file_descriptor)
+    try:
+        shutil.copyfile(str(blob_path), temporary_path)
+        os.replace(temporary_path, str(destination))
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+HERO_SKIN_FOLDER_PATTERN = re.compile(r"([\w_]+)_[a-zA-Z]")
+
+# Files under the source folder (relative to the archive/folder root, "." for the root itself) are managed under the
+# destination folder
+ContentRoot = NamedTuple("ContentRoot", [("source", str), ("destination", str)])
+
+# A directory or file below a folder by its relative posix path, the size and modification time are -1 for directories
+TreeEntry = NamedTuple("TreeEntry", [("path", str), ("size", int), ("mtime_ns", int)])
+
+
+def walk_directory_tree(folder: Path, include_files: bool = True) -> Iterator[TreeEntry]:
+    # Lazy, a single folder is open at a time and only the folders still to be visited are kept. Directory entries are
+    # classified from the scandir results, without an extra stat per directory.
+    pending_directories = [("", str(folder))]
+    while pending_directories:
+        relative_directory, directory_path = pending_directories.pop()
+        with os.scandir(directory_path) as entries:
+            for entry in entries:
+                relative_path = relative_directory + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    pending_directories.append((relative_path + "/", entry.path))
+                    yield TreeEntry(path=relative_path, size=-1, mtime_ns=-1)
+                elif include_files and entry.is_file():
+                    entry_stat = entry.stat()
+                    yield TreeEntry(path=relative_path, size=entry_stat.st_size, mtime_ns=entry_stat.st_mtime_ns)
+
+
+def iterate_directories(folder: Path) -> Iterator[str]:
+    return (entry.path for entry in walk_directory_tree(folder, include_files=False))
+
+
+def iterate_files(folder: Path) -> Iterator[TreeEntry]:
+    return (entry for entry in walk_directory_tree(folder) if entry.size >= 0)
+
+
+def _split_directory(directory: str) -> (str, str):
+    parent, _, name = directory.rpartition("/")
+    return parent or ".", name
+
+
+def find_content_roots(directories: Iterable[str], moddable_folders: List[str]) -> List[ContentRoot]:
+    content_roots = []
+    hero_content_roots = set()
+    for directory in sorted(directories):
+        parent, name = _split_directory(directory)
+        if name in moddable_folders:
+            content_roots.append(ContentRoot(source=directory, destination=name))
+            continue
+        match = HERO_SKIN_FOLDER_PATTERN.fullmatch(name)
+        if match:
+            hero_content_root = ContentRoot(source=parent, destination="heroes/{}".format(match.group(1)))
+            if hero_content_root not in hero_content_roots:
+                hero_content_roots.add(hero_content_root)
+                content_roots.append(hero_content_root)
+    return content_roots
+
+
+def detect_mod_layout(directories: Iterable[str], moddable_folders: List[str]) -> ContentRoot:
+    content_roots = find_content_roots(directories, moddable_folders)
+
+    mod_content_folders = [content_root for content_root in content_roots if "/" not in content_root.destination]
+    if len(mod_content_folders) == 1:
+        return mod_content_folders[0]
+
+    # Not a top level moddable folder, try if it's a hero skin
+    for content_root in content_roots:
+        if content_root.destination.startswith("heroes/"):
+            return content_root
+
+    raise RuntimeError("Could not find mod content in archive")
+
+
+def map_to_mod_path(content_root: ContentRoot, relative_path: str) -> Optional[str]:
+    if content_root.source != ".":
+        source_prefix = content_root.source + "/"
+        if not relative_path.startswith(source_prefix):
+            return None
+        relative_path = relative_path[len(source_prefix):]
+    if not is_safe_relative_path(relative_path):
+        raise RuntimeError("Unsafe path in mod content '{}'".format(relative_path))
+    return content_root.destination + "/" + relative_path
+
+
+def is_safe_relative_path(relative_path: str) -> bool:
+    return not relative_path.startswith("/") and ".." not in relative_path.split("/")
+
+
+def map_mod_files(relative_paths: Iterable[str], content_root: ContentRoot) -> Dict[str, str]:
+    mod_files = {}
+    for relative_path in relative_paths:
+        mod_path = map_to_mod_path(content_root, relative_path)
+        if mod_path is not None:
+            mod_files[mod_path] = relative_path
+    return mod_files
+
+
+def iterate_mod_files(folder: Path, content_root: ContentRoot) -> Iterator[Tuple[str, TreeEntry]]:
+    # Only the source folder of the content root is walked, the entry paths stay relative to the folder
+    source_prefix = "" if content_root.source == "." else content_root.source + "/"
+    for entry in iterate_files(folder / content_root.source):
+        yield content_root.destination + "/" + entry.path, entry._replace(path=source_prefix + entry.path)
@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+from atomic_file import write_json_atomically
+
+# The modification time of the file in the mod contents folder, -1 when unknown. A file edited in place stays linked to
+# its blob, only its size or modification time tells that it changed.
+ModFile = NamedTuple("ModFile", [("hash", str), ("size", int), ("mtime_ns", int)])
+ModFile.__new__.__defaults__ = (-1,)
+
+ModManifest = Dict[str, ModFile]
+
+MOD_MANIFEST_FILENAME = "mod_manifest.json"
+
+
+def mod_manifest_exists(mod_folder: Path) -> bool:
+    return (mod_folder / MOD_MANIFEST_FILENAME).is_file()
+
+
+def load_mod_manifest(mod_folder: Path) -> ModManifest:
+    mod_manifest_path = mod_folder / MOD_MANIFEST_FILENAME
+    try:
+        with open(str(mod_manifest_path), "r") as manifest_in_file:
+            return {path: ModFile(*entry) for path, entry in json.load(manifest_in_file)["files"].items()}
+    except (KeyError, TypeError, ValueError) as e:
+        raise RuntimeError("Corrupt mod manifest {}, {}".format(mod_manifest_path, e))
+
+
+def persist_mod_manifest(mod_folder: Path, mod_manifest: ModManifest):
+    write_json_atomically(mod_folder / MOD_MANIFEST_FILENAME,
+                          {"files": {path: list(entry) for path, entry in sorted(mod_manifest.items())}},
+                          separators=(",", ":"))
@@ -0,0 +1,913 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+from pathlib import Path
+import tempfile
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import shutil
+import zipfile
+from archive_import import ConcurrentZipReader, detect_zip_mod_layout, list_zip_mod_members
+from batch_import import assign_mod_names, prepare_mod, ImportReport
+from backup_store import BackupStore
+from blob_store import BlobStore
+from conflicts import build_path_index, find_conflicts, resolve_file_owners, PathIndex
+from content_hash import hash_file
+from copy_engine import CopyEngine, DEFAULT_COPY_QUEUE_BYTES, DEFAULT_COPY_WORKERS
+from deploy_journal import load_deploy_journal, persist_deploy_journal, remove_deploy_journal, APPLY_PHASE, \
+    BACKUP_PHASE, DeployJournal, JournalOperation
+from deploy_plan import plan_deployment, FilePlan, PlannedFile
+from deployment_index import deployment_index_exists, load_deployment_index, persist_deployment_index, \
+    DeployedFile, DeploymentIndex
+from folder_watcher import create_folder_watcher, DEFAULT_POLLING_INTERVAL
+from instrumentation import BYTES_READ, BYTES_WRITTEN, FILES, INSTRUMENTATION_LOG_FILENAME, MKDIR, STAT, UNLINK, \
+    Instrumentation, PhaseRecord
+from master_manifest import load_master_manifest, DEFAULT_WRITE_DELAY, OrderedModSet
+from mod_bundle import bundle_blob_path, collect_missing_blobs, copy_blob_to_bundle, load_bundle_manifest, \
+    persist_bundle_manifest, validate_bundle_manifest, BundleTransfer
+from mod_layout import detect_mod_layout, find_content_roots, iterate_directories, iterate_files, iterate_mod_files, \
+    ContentRoot
+from mod_manifest import load_mod_manifest, mod_manifest_exists, persist_mod_manifest, MOD_MANIFEST_FILENAME, \
+    ModFile, ModManifest
+from profiles import load_cached_file_plan, load_profiles, persist_cached_file_plan, persist_profiles, \
+    remove_cached_file_plan, CachedFilePlan, Profile
+from progress import OperationCancelled, OperationProgress
+from verification import CORRUPTED_BLOB, MISSING, MISSING_BACKUP, MODIFIED, REPAIRABLE_REASONS, DriftedFile, \
+    VerificationReport
+
+
+class MainWindowModel:
+    MOD_CONTENT_SUBFOLDER_NAME = "_mod_contents"
+
+    def __init__(self, configuration: Dict, mod_manager_folder: str, game_folder: str):
+        self.mod_manager_folder = Path(mod_manager_folder)
+        self.managed_mods_folder = self.mod_manager_folder / "managed_mods"
+        self.original_data_backup_folder = self.mod_manager_folder / "original_data_backup"
+        self.instrumentation = Instrumentation(self.mod_manager_folder / INSTRUMENTATION_LOG_FILENAME
+                                               if configuration.get("instrumentation_log", False) else None)
+        self.blob_store = BlobStore(self.mod_manager_folder / "objects", self.instrumentation)
+        self.import_staging_folder = self.mod_manager_folder / "import_staging"
+
+        self._ensure_directory_exists(self.managed_mods_folder)
+        self.backup_store = BackupStore(self.original_data_backup_folder, self.instrumentation)
+        self.backup_store.migrate_legacy_backups()
+        self._remove_legacy_staging_folder()
+        self._clear_import_staging_folder()
+
+        self.game_folder = Path(game_folder)
+        self.configuration = configuration
+        self.master_manifest = load_master_manifest(
+            self.mod_manager_folder, write_delay=configuration.get("master_manifest_write_delay", DEFAULT_WRITE_DELAY))
+        self._load_ordered_mod_names_cache = None
+        self.profiles = load_profiles(self.mod_manager_folder)
+        self._profile_file_plans = {}
+        # The managed mods are listed once, then kept up to date by the model, which adds every mod itself
+        self._managed_mod_names = None
+        # Bumped by every change of the managed, active or deployed mods or the load order, views redraw on a change
+        self.mod_registry_revision = 0
+        self._mod_manifests = {}
+        self._path_index_cache = None
+        self._conflicts_cache = None
+        self.deployment_index = self._load_deployment_index()
+        self.folder_watcher = None
+        self.recover_interrupted_deploy(
+            roll_back=configuration.get("interrupted_deploy_action", "roll_back") == "roll_back")
+
+    def start_watching(self):
+        # Out of band changes, e.g. a game update or hand edited mods, are revalidated before the next deploy
+        roots = [self.managed_mods_folder] + [self.game_folder / moddable_folder
+                                              for moddable_folder in self.configuration["moddable_folders"]]
+        self.folder_watcher = create_folder_watcher(
+            roots, use_inotify=self.configuration.get("folder_watcher", "auto") != "polling",
+            polling_interval=self.configuration.get("folder_watcher_polling_interval", DEFAULT_POLLING_INTERVAL))
+        self.folder_watcher.start()
+
+    def close(self):
+        # Called on exit, writes the changes which are still waiting for the write delay
+        self.stop_watching()
+        self.master_manifest.flush()
+
+    def stop_watching(self):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+
+    def revalidate_changed_files(self) -> List[str]:
+        # Returns the deployed paths which were changed by something else since the last revalidation
+        if self.folder_watcher is None:
+            return []
+        dirty_paths = self.folder_watcher.take_dirty_paths()
+        dirty_game_paths = set()
+        dirty_mod_names = set()
+        for path in dirty_paths.paths:
+            try:
+                mod_path_parts = path.relative_to(self.managed_mods_folder).parts
+            except ValueError:
+                dirty_game_paths.add(path.relative_to(self.game_folder).as_posix())
+                continue
+            if not mod_path_parts:
+                continue
+            mod_name = mod_path_parts[0]
+            if not (self.managed_mods_folder / mod_name).is_dir() or not self.is_mod_managed(mod_name):
+                # Removed or added by hand
+                self._managed_mod_names = None
+                self.mod_registry_revision += 1
+            dirty_mod_names.add(mod_name)
+
+        if dirty_paths.complete:
+            deployed_paths = self._get_deployed_paths_under(dirty_game_paths)
+        else:
+            deployed_paths = list(self.deployment_index)
+            dirty_mod_names = set(self.get_managed_mod_names())
+        changed_paths, damaged_hashes = self._revalidate_deployed_files(deployed_paths)
+        for content_hash in damaged_hashes:
+            self.blob_store.remove_blob(content_hash)
+        revalidated_mod_names = set()
+        while dirty_mod_names or damaged_hashes:
+            if damaged_hashes:
+                # The files of every mod sharing a damaged blob changed with it, they are hashed again. They are
+                # further links to the written file, the watcher may have had no event for them.
+                dirty_mod_names.update(mod_name for mod_name in self.get_managed_mod_names()
+                                       if mod_name not in revalidated_mod_names
+                                       and any(mod_file.hash in damaged_hashes
+                                               for mod_file in self._get_mod_manifest(mod_name).values()))
+            damaged_hashes = set()
+            for mod_name in dirty_mod_names - revalidated_mod_names:
+                revalidated_mod_names.add(mod_name)
+                if self.is_mod_managed(mod_name):
+                    damaged_hashes |= self._revalidate_mod_files(mod_name)
+            dirty_mod_names = set()
+        return changed_paths
+
+    def _get_deployed_paths_under(self, paths: Set[str]) -> List[str]:
+        deployed_paths = [path for path in paths if path in self.deployment_index]
+        # A folder was removed or moved, its deployed files have no events of their own
+        folder_paths = {path for path in paths if path not in self.deployment_index
+                        and not (self.game_folder / path).is_file()}
+        if folder_paths:
+            deployed_paths.extend(deployed_path for deployed_path in self.deployment_index
+                                  if deployed_path not in paths
+                                  and any(parent in folder_paths for parent in self._get_parent_paths(deployed_path)))
+        return deployed_paths
+
+    @staticmethod
+    def _get_parent_paths(relative_path: str) -> List[str]:
+        parts = relative_path.split("/")
+        return ["/".join(parts[:length]) for length in range(1, len(parts))]
+
+    def _revalidate_deployed_files(self, deployed_paths: List[str]) -> Tuple[List[str], Set[str]]:
+        # Returns the changed paths, and the hashes of the blobs which were written through a deployed link
+        changed_paths = []
+        damaged_hashes = set()
+        for path in deployed_paths:
+            deployed_file = self.deployment_index[path]
+            try:
+                deployed_file_stat = (self.game_folder / path).stat()
+            except FileNotFoundError:
+                # Deleted by hand, the deployed state is restored
+                self.deployment_index[path] = deployed_file._replace(
+                    mtime_ns=self._deploy_file(path, deployed_file.hash))
+                changed_paths.append(path)
+                continue
+            if (deployed_file_stat.st_size, deployed_file_stat.st_mtime_ns) == (deployed_file.size,
+                                                                                deployed_file.mtime_ns):
+                continue
+            changed_paths.append(path)
+            blob_path = self.blob_store.blob_path(deployed_file.hash)
+            if blob_path.is_file() and os.path.samefile(str(self.game_folder / path), str(blob_path)):
+                # Written in place through the link, not a game update. The original stays backed up, the blob is
+                # damaged, and the next deploy links the mod files hashed again.
+                damaged_hashes.add(deployed_file.hash)
+                continue
+            # Replaced, e.g. by a game update, it is the new original which the next deploy backs up
+            self.deployment_index.pop(path)
+            self.backup_store.forget(path)
+        if changed_paths:
+            self.backup_store.persist()
+            persist_deployment_index(self.mod_manager_folder, self.deployment_index)
+            self.mod_registry_revision += 1
+        return sorted(changed_paths), damaged_hashes
+
+    def _revalidate_mod_files(self, mod_name: str) -> Set[str]:
+        # Files still linked to their blob, with the size and modification time they were linked with, are unchanged,
+        # only the others are hashed. Returns the hashes of the removed blobs which were edited in place.
+        mod_manifest = self._get_mod_manifest(mod_name)
+        content_folder = self._get_mod_content_folder(mod_name)
+        revalidated_mod_manifest = {}
+        damaged_hashes = set()
+        for file_entry in iterate_files(content_folder):
+            relative_path = file_entry.path
+            mod_file_path = content_folder / relative_path
+            mod_file = mod_manifest.get(relative_path)
+            linked_to_blob = mod_file is not None and self.blob_store.has_blob(mod_file.hash) and \
+                os.path.samefile(str(mod_file_path), str(self.blob_store.blob_path(mod_file.hash)))
+            if linked_to_blob and (mod_file.size, mod_file.mtime_ns) == (file_entry.size, file_entry.mtime_ns):
+                revalidated_mod_manifest[relative_path] = mod_file
+                continue
+            content_hash = self.blob_store.add_file(mod_file_path)
+            if linked_to_blob and content_hash != mod_file.hash:
+                # Edited in place, the blob no longer holds the content its hash names
+                self.blob_store.remove_blob(mod_file.hash)
+                damaged_hashes.add(mod_file.hash)
+            revalidated_mod_manifest[relative_path] = ModFile(
+                hash=content_hash, size=file_entry.size, mtime_ns=self._link_mod_file(content_hash, mod_file_path))
+        if revalidated_mod_manifest != mod_manifest:
+            persist_mod_manifest(self.managed_mods_folder / mod_name, revalidated_mod_manifest)
+            self._mod_manifests[mod_name] = revalidated_mod_manifest
+            self._path_index_cache = None
+            self._conflicts_cache = None
+            self.mod_registry_revision += 1
+        return damaged_hashes
+
+    def add_instrumentation_observer(self, observer: Callable[[PhaseRecord], None]):
+        self.instrumentation.add_observer(observer)
+
+    def remove_instrumentation_observer(self, observer: Callable[[PhaseRecord], None]):
+        self.instrumentation.remove_observer(observer)
+
+    @staticmethod
+    def _ensure_directory_exists(directory: Path):
+        if not directory.is_dir():
+            directory.mkdir()
+
+    def _remove_legacy_staging_folder(self):
+        # Older versions staged the deployed files in a full copy, the deployed state is now derived from the manifest
+        legacy_staging_folder = self.mod_manager_folder / "mod_staging"
+        if legacy_staging_folder.is_dir():
+            shutil.rmtree(str(legacy_staging_folder))
+
+    def _clear_import_staging_folder(self):
+        # Anything left here is from an interrupted import
+        if self.import_staging_folder.is_dir():
+            shutil.rmtree(str(self.import_staging_folder))
+        self.import_staging_folder.mkdir()
+
+    def get_managed_mod_names(self) -> List[str]:
+        if self._managed_mod_names is None:
+            self._managed_mod_names = OrderedModSet(content.name for content in self.managed_mods_folder.iterdir()
+                                                    if content.is_dir())
+        return list(self._managed_mod_names.as_list())
+
+    def is_mod_managed(self, mod_name: str) -> bool:
+        if self._managed_mod_names is None:
+            self.get_managed_mod_names()
+        return mod_name in self._managed_mod_names
+
+    def _register_managed_mod(self, mod_name: str):
+        if self._managed_mod_names is not None:
+            self._managed_mod_names.add(mod_name)
+        self.mod_registry_revision += 1
+
+    def get_active_mod_names(self) -> List[str]:
+        return list(self.master_manifest.active_mods.as_list())
+
+    def get_deployed_mod_names(self) -> List[str]:
+        return list(self.master_manifest.deployed_mods.as_list())
+
+    def is_mod_active(self, mod_name: str) -> bool:
+        return mod_name in self.master_manifest.active_mods
+
+    def is_mod_deployed(self, mod_name: str) -> bool:
+        return mod_name in self.master_manifest.deployed_mods
+
+    def get_load_ordered_mod_names(self) -> List[str]:
+        # The active mods in the order they are deployed in, later ones override the files of earlier ones. Sorted
+        # again only when the manifest changed.
+        if self._load_ordered_mod_names_cache is None or \
+                self._load_ordered_mod_names_cache[0] != self.master_manifest.revision:
+            load_order_positions = {mod_name: position
+                                    for position, mod_name in enumerate(self.master_manifest.load_order)}
+            activation_positions = {mod_name: position for position, mod_name in enumerate(self.get_active_mod_names())}
+            self._load_ordered_mod_names_cache = (self.master_manifest.revision, sorted(
+                self.get_active_mod_names(), key=lambda mod_name: (
+                    load_order_positions.get(mod_name, len(load_order_positions)), activation_positions[mod_name])))
+        return list(self._load_ordered_mod_names_cache[1])
+
+    def set_load_order(self, mod_names: List[str]):
+        for mod_name in mod_names:
+            assert self.is_mod_managed(mod_name), "Mod {} is not managed".format(mod_name)
+        assert len(set(mod_names)) == len(mod_names), "Duplicate mods in the load order"
+
+        self.master_manifest.set_load_order(mod_names)
+        self.mod_registry_revision += 1
+
+    def move_mod_in_load_order(self, mod_name: str, offset: int):
+        load_ordered_mod_names = self.get_load_ordered_mod_names()
+        assert mod_name in load_ordered_mod_names, "Mod not active"
+        position = load_ordered_mod_names.index(mod_name)
+        new_position = min(max(position + offset, 0), len(load_ordered_mod_names) - 1)
+        load_ordered_mod_names.insert(new_position, load_ordered_mod_names.pop(position))
+        inactive_mod_names = [name for name in self.master_manifest.load_order if not self.is_mod_active(name)]
+        self.set_load_order(load_ordered_mod_names + inactive_mod_names)
+
+    def get_conflicts(self) -> Dict[Tuple[str, str], List[str]]:
+        # (overridden mod, overriding mod) -> the overridden paths, for the active mods in load order
+        load_ordered_mod_names = tuple(self.get_load_ordered_mod_names())
+        if self._conflicts_cache is None or self._conflicts_cache[0] != load_ordered_mod_names:
+            self._conflicts_cache = (load_ordered_mod_names,
+                                     find_conflicts(self._get_path_index(load_ordered_mod_names)))
+        return self._conflicts_cache[1]
+
+    def _get_path_index(self, mod_names: Tuple[str, ...]) -> PathIndex:
+        if self._path_index_cache is None or self._path_index_cache[0] != mod_names:
+            self._path_index_cache = (mod_names, build_path_index(
+                (mod_name, self._get_mod_manifest(mod_name)) for mod_name in mod_names))
+        return self._path_index_cache[1]
+
+    def _get_new_mod_folder(self, mod_name: str) -> Path:
+        new_mod_folder = self.managed_mods_folder / mod_name
+        if new_mod_folder.is_file() or new_mod_folder.is_dir():
+            raise RuntimeError("There is a managed mod called '{}' already".format(mod_name))
+        return new_mod_folder
+
+    def add_mod(self, mod_name: str, mod_content_folder: Path, progress: Optional[OperationProgress] = None):
+        new_mod_folder = self._get_new_mod_folder(mod_name)
+        with self.instrumentation.phase("add_mod", "store"):
+            mod_manifest = self._add_files_to_blob_store(mod_content_folder, Path(mod_content_folder.name), progress)
+        with self.instrumentation.phase("add_mod", "link"):
+            self._write_managed_mod(new_mod_folder, mod_manifest, progress)
+
+    def find_zip_mod_content(self, archive_path: Path) -> ContentRoot:
+        return detect_zip_mod_layout(archive_path, self.configuration["moddable_folders"])
+
+    def add_mod_from_zip(self, mod_name: str, archive_path: Path, content_root: ContentRoot,
+                         progress: Optional[OperationProgress] = None):
+        # Only the members under the content root are read, and they are streamed straight into the blob store
+        new_mod_folder = self._get_new_mod_folder(mod_name)
+        with self.instrumentation.phase("add_mod_from_zip", "store"):
+            with zipfile.ZipFile(str(archive_path)) as zip_file:
+                mod_members = list_zip_mod_members(zip_file, content_root)
+                zip_reader = ConcurrentZipReader(zip_file)
+                if progress is not None:
+                    progress.start_stage("Storing files", len(mod_members),
+                                         sum(member_info.file_size for member_info in mod_members.values()))
+                with self._create_copy_engine(progress) as copy_engine:
+                    for mod_path, member_info in mod_members.items():
+                        copy_engine.submit(mod_path, zip_reader.read_member, member_info, self.blob_store.add_stream,
+                                           size=member_info.file_size)
+                    content_hashes = copy_engine.wait()
+            mod_manifest = {mod_path: ModFile(hash=content_hash, size=member_info.file_size)
+                            for (mod_path, member_info), content_hash in zip(mod_members.items(), content_hashes)}
+        with self.instrumentation.phase("add_mod_from_zip", "link"):
+            self._write_managed_mod(new_mod_folder, mod_manifest, progress)
+
+    def _add_files_to_blob_store(self, folder: Path, relative_path_prefix: Path,
+                                 progress: Optional[OperationProgress] = None) -> ModManifest:
+        # The files are stored while the folder is still walked, the totals grow as they are found
+        mod_files = []
+        if progress is not None:
+            progress.start_stage("Storing files")
+        with self._create_copy_engine(progress) as copy_engine:
+            for file_entry in iterate_files(folder):
+                if progress is not None:
+                    progress.extend_stage(1, file_entry.size)
+                mod_files.append(file_entry)
+                copy_engine.submit(file_entry.path, self.blob_store.add_file, folder / file_entry.path,
+                                   size=file_entry.size)
+            content_hashes = copy_engine.wait()
+        return {(relative_path_prefix / file_entry.path).as_posix(): ModFile(hash=content_hash, size=file_entry.size)
+                for file_entry, content_hash in zip(mod_files, content_hashes)}
+
+    def _create_copy_engine(self, progress: Optional[OperationProgress] = None) -> CopyEngine:
+        return CopyEngine(max_workers=self.configuration.get("copy_workers", DEFAULT_COPY_WORKERS),
+                          max_queued_bytes=self.configuration.get("copy_queue_bytes", DEFAULT_COPY_QUEUE_BYTES),
+                          progress=progress)
+
+    def _write_managed_mod(self, mod_folder: Path, mod_manifest: ModManifest,
+                           progress: Optional[OperationProgress] = None):
+        # The mod is assembled next to the managed mods and renamed into place, so it either fully exists or not at all.
+        # Its contents folder only holds links to the blobs.
+        staged_mod_folder = Path(tempfile.mkdtemp(dir=str(self.import_staging_folder)))
+        mod_content_folder = staged_mod_folder / self.MOD_CONTENT_SUBFOLDER_NAME
+        mod_content_folder.mkdir()
+        if progress is not None:
+            progress.start_stage("Linking files", len(mod_manifest),
+                                 sum(mod_file.size for mod_file in mod_manifest.values()))
+        try:
+            with self._create_copy_engine(progress) as copy_engine:
+                for relative_path, mod_file in mod_manifest.items():
+                    copy_engine.submit(relative_path, self._link_mod_file, mod_file.hash,
+                                       mod_content_folder / relative_path, size=mod_file.size)
+                modification_times = copy_engine.wait()
+        except Exception:
+            shutil.rmtree(str(staged_mod_folder))
+            raise
+        mod_manifest = {relative_path: mod_file._replace(mtime_ns=modification_time) for (relative_path, mod_file),
+                        modification_time in zip(mod_manifest.items(), modification_times)}
+        persist_mod_manifest(staged_mod_folder, mod_manifest)
+
+        if mod_folder.is_dir():
+            replaced_mod_folder = Path(tempfile.mkdtemp(dir=str(self.import_staging_folder)))
+            os.replace(str(mod_folder), str(replaced_mod_folder / mod_folder.name))
+            os.replace(str(staged_mod_folder), str(mod_folder))
+            shutil.rmtree(str(replaced_mod_folder))
+        else:
+            os.replace(str(staged_mod_folder), str(mod_folder))
+        self._mod_manifests[mod_folder.name] = mod_manifest
+        self._register_managed_mod(mod_folder.name)
+
+    def _link_mod_file(self, content_hash: str, destination: Path) -> int:
+        self.blob_store.link_or_copy(content_hash, destination)
+        return destination.stat().st_mtime_ns
+
+    def add_mod_from_path(self, mod_name: str, source: Path):
+        # Unlike find_or_create_mod_content_folder, this never writes into the source folder
+        new_mod_folder = self._get_new_mod_folder(mod_name)
+        with self.instrumentation.phase("add_mod_from_path", "store"):
+            mod_manifest = prepare_mod(source, self.configuration["moddable_folders"], self.blob_store.folder,
+                                       self.import_staging_folder)
+        if not mod_manifest:
+            raise RuntimeError("No mod files found in {}".format(source))
+        with self.instrumentation.phase("add_mod_from_path", "link"):
+            self._write_managed_mod(new_mod_folder, mod_manifest)
+
+    def import_mods(self, sources: List[Path]) -> ImportReport:
+        mod_sources, skipped = assign_mod_names(sources, self.get_managed_mod_names())
+        succeeded = []
+        failed = []
+        # Extraction and layout detection run in worker processes, the managed mods are created here one by one
+        with ProcessPoolExecutor(max_workers=self.configuration.get("import_workers")) as executor:
+            prepared_mods = {mod_name: executor.submit(prepare_mod, source, self.configuration["moddable_folders"],
+                                                       self.blob_store.folder, self.import_staging_folder)
+                             for mod_name, source in mod_sources.items()}
+            for mod_name, prepared_mod in prepared_mods.items():
+                try:
+                    mod_manifest = prepared_mod.result()
+                    if not mod_manifest:
+                        raise RuntimeError("No mod files found")
+                    with self.instrumentation.phase("import_mods", "link"):
+                        self._write_managed_mod(self.managed_mods_folder / mod_name, mod_manifest)
+                except Exception as e:
+                    failed.append((str(mod_sources[mod_name]), str(e)))
+                    continue
+                succeeded.append(mod_name)
+        return ImportReport(succeeded=succeeded, skipped=skipped, failed=failed)
+
+    def export_mods(self, bundle_folder: Path, mod_names: Optional[List[str]] = None,
+                    progress: Optional[OperationProgress] = None) -> BundleTransfer:
+        # Adds the mods to the bundle, which may already hold other mods and blobs, only the missing blobs are copied
+        mod_names = mod_names or self.get_managed_mod_names()
+        for mod_name in mod_names:
+            assert self.is_mod_managed(mod_name), "Mod {} is not managed".format(mod_name)
+        bundle_folder.mkdir(parents=True, exist_ok=True)
+        bundle_manifest = load_bundle_manifest(bundle_folder)
+        mod_manifests = {mod_name: self._get_mod_manifest(mod_name) for mod_name in mod_names}
+        missing_blobs = collect_missing_blobs(
+            list(mod_manifests.values()), lambda content_hash: bundle_blob_path(bundle_folder, content_hash).is_file())
+
+        with self.instrumentation.phase("export_mods", "copy"):
+            if progress is not None:
+                progress.start_stage("Exporting files", len(missing_blobs), sum(missing_blobs.values()))
+            with self._create_copy_engine(progress) as copy_engine:
+                for content_hash, size in missing_blobs.items():
+                    copy_engine.submit(content_hash, copy_blob_to_bundle, self.blob_store.blob_path(content_hash),
+                                       bundle_folder, content_hash, size=size)
+        # Written last, the bundle never references blobs it does not have
+        bundle_manifest.update(mod_manifests)
+        persist_bundle_manifest(bundle_folder, bundle_manifest)
+        return BundleTransfer(mods=list(mod_names), skipped=[], blobs=len(missing_blobs),
+                              bytes=sum(missing_blobs.values()))
+
+    def import_bundle(self, bundle_folder: Path, progress: Optional[OperationProgress] = None) -> BundleTransfer:
+        # The mods are taken as they are in the bundle without detecting their layout, only the blobs missing from the
+        # blob store are fetched. Mods whose name is already taken are skipped.
+        bundle_manifest = load_bundle_manifest(bundle_folder)
+        if not bundle_manifest:
+            raise RuntimeError("No mods found in bundle {}".format(bundle_folder))
+        validate_bundle_manifest(bundle_manifest, self.configuration["moddable_folders"])
+        mod_manifests = {}
+        skipped = []
+        for mod_name, mod_manifest in sorted(bundle_manifest.items()):
+            if not self.is_mod_managed(mod_name):
+                mod_manifests[mod_name] = mod_manifest
+            elif {path: (mod_file.hash, mod_file.size) for path, mod_file in self._get_mod_manifest(mod_name).items()} \
+                    == {path: (mod_file.hash, mod_file.size) for path, mod_file in mod_manifest.items()}:
+                skipped.append((mod_name, "up to date"))
+            else:
+                skipped.append((mod_name, "name taken by a different mod"))
+        missing_blobs = collect_missing_blobs(list(mod_manifests.values()), self.blob_store.has_blob)
+
+        with self.instrumentation.phase("import_bundle", "fetch"):
+            if progress is not None:
+                progress.start_stage("Fetching files", len(missing_blobs), sum(missing_blobs.values()))
+            with self._create_copy_engine(progress) as copy_engine:
+                for content_hash, size in missing_blobs.items():
+                    copy_engine.submit(content_hash, self._fetch_bundle_blob, bundle_folder, content_hash, size=size)
+        with self.instrumentation.phase("import_bundle", "link"):
+            for mod_name, mod_manifest in mod_manifests.items():
+                self._write_managed_mod(self.managed_mods_folder / mod_name, mod_manifest, progress)
+        return BundleTransfer(mods=list(mod_manifests), skipped=skipped, blobs=len(missing_blobs),
+                              bytes=sum(missing_blobs.values()))
+
+    def _fetch_bundle_blob(self, bundle_folder: Path, content_hash: str):
+        # Hashed while it is stored, a damaged blob in the bundle never enters the blob store under the wrong hash
+        blob_path = bundle_blob_path(bundle_folder, content_hash)
+        if not blob_path.is_file():
+            raise RuntimeError("The bundle is missing the file {}".format(content_hash))
+        stored_hash = self.blob_store.add_file(blob_path)
+        if stored_hash != content_hash:
+            raise RuntimeError("The bundle file {} is corrupt".format(content_hash))
+
+    def _get_mod_manifest(self, mod_name: str) -> ModManifest:
+        if mod_name not in self._mod_manifests:
+            mod_folder = self.managed_mods_folder / mod_name
+            if mod_manifest_exists(mod_folder):
+                self._mod_manifests[mod_name] = load_mod_manifest(mod_folder)
+            else:
+                # Added by a version without a blob store, move its contents into the store once
+                mod_manifest = self._add_files_to_blob_store(self._get_mod_content_folder(mod_name), Path())
+                self._write_managed_mod(mod_folder, mod_manifest)
+        return self._mod_manifests[mod_name]
+
+    def activate_mod(self, mod_name: str):
+        assert not self.is_mod_active(mod_name), "Mod already active"
+        assert self.is_mod_managed(mod_name), "Mod is not managed"
+
+        self.master_manifest.activate_mod(mod_name)
+        self.mod_registry_revision += 1
+
+    def deactivate_mod(self, mod_name: str):
+        assert self.is_mod_active(mod_name), "Mod not active"
+        assert self.is_mod_managed(mod_name), "Mod is not managed"
+
+        self.master_manifest.deactivate_mod(mod_name)
+        self.mod_registry_revision += 1
+
+    def get_profile_names(self) -> List[str]:
+        return sorted(self.profiles)
+
+    def get_profile(self, profile_name: str) -> Profile:
+        assert profile_name in self.profiles, "There is no profile called '{}'".format(profile_name)
+        return self.profiles[profile_name]
+
+    def save_profile(self, profile_name: str):
+        # The active mods in their load order become the profile, and its file plan is computed right away
+        assert profile_name, "The profile needs a name"
+        self.profiles[profile_name] = Profile(active_mods=self.get_load_ordered_mod_names())
+        persist_profiles(self.mod_manager_folder, self.profiles)
+        self._profile_file_plans.pop(profile_name, None)
+        self._get_profile_file_plan(profile_name)
+        self.mod_registry_revision += 1
+
+    def delete_profile(self, profile_name: str):
+        self.get_profile(profile_name)
+        del self.profiles[profile_name]
+        persist_profiles(self.mod_manager_folder, self.profiles)
+        self._profile_file_plans.pop(profile_name, None)
+        remove_cached_file_plan(self.mod_manager_folder, profile_name)
+        self.mod_registry_revision += 1
+
+    def switch_profile(self, profile_name: str, progress: Optional[OperationProgress] = None):
+        # Activates the mods of the profile and deploys them, only the files which differ from the deployed ones
+        # are touched
+        profile = self.get_profile(profile_name)
+        for mod_name in profile.active_mods:
+            assert self.is_mod_managed(mod_name), "Mod {} of the profile is not managed".format(mod_name)
+        with self.instrumentation.phase("switch_profile", "plan"):
+            self.revalidate_changed_files()
+            operations = self._plan_journal_operations(self._get_profile_file_plan(profile_name))
+
+        profile_mod_names = set(profile.active_mods)
+        self.master_manifest.set_active_mods(profile.active_mods)
+        self.master_manifest.set_load_order(profile.active_mods + [
+            mod_name for mod_name in self.master_manifest.load_order if mod_name not in profile_mod_names])
+        self.mod_registry_revision += 1
+        self._deploy_journal_operations(list(profile.active_mods), operations, progress)
+
+    def _get_profile_file_plan(self, profile_name: str) -> FilePlan:
+        # Reused until one of the member mods changes, which rewrites its manifest
+        profile = self.profiles[profile_name]
+        cached_file_plan = self._profile_file_plans.get(profile_name) or load_cached_file_plan(
+            self.mod_manager_folder, profile_name)
+        mod_versions = {mod_name: self._get_mod_version(mod_name) for mod_name in profile.active_mods}
+        if cached_file_plan is None or cached_file_plan.mod_versions != mod_versions:
+            file_plan = self._resolve_file_plan(profile.active_mods)
+            # Resolving migrates mods added by older versions, which changes their version
+            mod_versions = {mod_name: self._get_mod_version(mod_name) for mod_name in profile.active_mods}
+            cached_file_plan = CachedFilePlan(mod_versions=mod_versions, files=file_plan)
+            persist_cached_file_plan(self.mod_manager_folder, profile_name, cached_file_plan)
+        self._profile_file_plans[profile_name] = cached_file_plan
+        return cached_file_plan.files
+
+    def _get_mod_version(self, mod_name: str) -> Optional[str]:
+        # The hash of the manifest contents, its size and modification time can stay the same when a hash is replaced
+        try:
+            return hash_file(self.managed_mods_folder / mod_name / MOD_MANIFEST_FILENAME)
+        except FileNotFoundError:
+            return None
+
+    def deploy_mods(self, progress: Optional[OperationProgress] = None):
+        with self.instrumentation.phase("deploy_mods", "plan"):
+            self.revalidate_changed_files()
+            load_ordered_mod_names = self.get_load_ordered_mod_names()
+            operations = self._plan_journal_operations(self._resolve_file_plan(load_ordered_mod_names))
+        self._deploy_journal_operations(load_ordered_mod_names, operations, progress)
+
+    def _resolve_file_plan(self, mod_names: List[str]) -> FilePlan:
+        file_plan = {}
+        for path, mod_name in self._resolve_file_owners(mod_names).items():
+            mod_file = self._get_mod_manifest(mod_name)[path]
+            file_plan[path] = PlannedFile(mod=mod_name, hash=mod_file.hash, size=mod_file.size)
+        return file_plan
+
+    def _plan_journal_operations(self, file_plan: FilePlan) -> List[JournalOperation]:
+        deployed_files = {path: deployed_file.mod for path, deployed_file in self.deployment_index.items()}
+        deploy_plan = plan_deployment(deployed_files, {path: planned_file.mod
+                                                       for path, planned_file in file_plan.items()})
+        # The owner stayed, but its file was edited since it was deployed
+        deploy_plan.changed.extend(path for path, planned_file in file_plan.items()
+                                   if deployed_files.get(path) == planned_file.mod
+                                   and self.deployment_index[path].hash != planned_file.hash)
+
+        operations = [JournalOperation(path=path, old=self.deployment_index[path], new=None)
+                      for path in deploy_plan.removed]
+        operations.extend(JournalOperation(path=path, old=None,
+                                           new=self._get_planned_deployed_file(file_plan[path], False))
+                          for path in deploy_plan.added)
+        operations.extend(JournalOperation(path=path, old=self.deployment_index[path],
+                                           new=self._get_planned_deployed_file(
+                                               file_plan[path], self.deployment_index[path].backed_up))
+                          for path in deploy_plan.changed)
+        return operations
+
+    def _deploy_journal_operations(self, load_ordered_mod_names: List[str], operations: List[JournalOperation],
+                                   progress: Optional[OperationProgress] = None):
+        if not operations:
+            with self.instrumentation.phase("deploy_mods", "commit"):
+                self._commit_deployment(load_ordered_mod_names)
+            return
+
+        # Every operation is recorded before any of them runs, an interrupted deploy can be resumed or rolled back
+        deploy_journal = DeployJournal(phase=BACKUP_PHASE, previous_deployed_mods=self.get_deployed_mod_names(),
+                                       deployed_mods=load_ordered_mod_names, operations=operations)
+        with self.instrumentation.phase("deploy_mods", "journal"):
+            # The active mods being deployed survive the deploy being interrupted
+            self.master_manifest.flush()
+            persist_deploy_journal(self.mod_manager_folder, deploy_journal)
+        try:
+            self._run_deploy_journal(deploy_journal, progress)
+        except Exception as e:
+            if progress is not None:
+                progress.start_stage("Rolling back")
+            try:
+                self._roll_back_deploy_journal(load_deploy_journal(self.mod_manager_folder))
+            except Exception as rollback_error:
+                raise RuntimeError("{}, rolling back failed too, {}".format(e, rollback_error))
+            if isinstance(e, OperationCancelled):
+                raise
+            raise RuntimeError(e)
+
+    def recover_interrupted_deploy(self, roll_back: bool):
+        deploy_journal = load_deploy_journal(self.mod_manager_folder)
+        if deploy_journal is None:
+            return
+        try:
+            if roll_back:
+                self._roll_back_deploy_journal(deploy_journal)
+            else:
+                self._run_deploy_journal(deploy_journal)
+        except Exception as e:
+            raise RuntimeError("Could not recover the interrupted deploy, {}".format(e))
+
+    @staticmethod
+    def _get_planned_deployed_file(planned_file: PlannedFile, backed_up: bool) -> DeployedFile:
+        # The modification time is only known once the file is deployed
+        return DeployedFile(mod=planned_file.mod, hash=planned_file.hash, size=planned_file.size, mtime_ns=0,
+                            backed_up=backed_up)
+
+    def _run_deploy_journal(self, deploy_journal: DeployJournal, progress: Optional[OperationProgress] = None):
+        # Each operation is idempotent, so running an interrupted journal again resumes it
+        operations = deploy_journal.operations
+        if deploy_journal.phase == BACKUP_PHASE:
+            with self.instrumentation.phase("deploy_mods", "backup"):
+                added_operations = [operation for operation in operations if operation.old is None]
+                if progress is not None:
+                    progress.start_stage("Backing up original files", len(added_operations),
+                                         sum(operation.new.size for operation in added_operations))
+                with self._create_copy_engine(progress) as copy_engine:
+                    for operation in added_operations:
+                        copy_engine.submit(operation.path, self._backup_file, operation.path, size=operation.new.size)
+                    backed_up = dict(zip((operation.path for operation in added_operations), copy_engine.wait()))
+                operations = [operation._replace(new=operation.new._replace(backed_up=backed_up[operation.path]))
+                              if operation.path in backed_up else operation for operation in operations]
+                self.backup_store.persist()
+                deploy_journal = deploy_journal._replace(phase=APPLY_PHASE, operations=operations)
+                persist_deploy_journal(self.mod_manager_folder, deploy_journal)
+
+        with self.instrumentation.phase("deploy_mods", "apply"):
+            if progress is not None:
+                progress.start_stage("Deploying files", len(operations),
+                                     sum((operation.new or operation.old).size for operation in operations))
+            with self._create_copy_engine(progress) as copy_engine:
+                for operation in operations:
+                    if operation.new is None:
+                        copy_engine.submit(operation.path, self._undeploy_file, operation.path, operation.old.backed_up,
+                                           size=operation.old.size)
+                    else:
+                        copy_engine.submit(operation.path, self._deploy_file, operation.path, operation.new.hash,
+                                           size=operation.new.size)
+                modification_times = copy_engine.wait()
+
+        with self.instrumentation.phase("deploy_mods", "commit"):
+            for operation, modification_time in zip(operations, modification_times):
+                if operation.new is None:
+                    self.deployment_index.pop(operation.path, None)
+                else:
+                    self.deployment_index[operation.path] = operation.new._replace(mtime_ns=modification_time)
+            self._commit_deployment(deploy_journal.deployed_mods)
+            remove_deploy_journal(self.mod_manager_folder)
+
+    def _roll_back_deploy_journal(self, deploy_journal: DeployJournal):
+        with self.instrumentation.phase("deploy_mods", "roll_back"):
+            with self._create_copy_engine() as copy_engine:
+                for operation in deploy_journal.operations:
+                    # Nothing was changed in the backup phase, and the backups made are of the current originals
+                    if deploy_journal.phase == BACKUP_PHASE:
+                        continue
+                    if operation.old is None:
+                        copy_engine.submit(operation.path, self._undeploy_file, operation.path, operation.new.backed_up,
+                                           size=operation.new.size)
+                    else:
+                        copy_engine.submit(operation.path, self._redeploy_file, operation.path, operation.old,
+                                           size=operation.old.size)
+
+            # The commit may have been interrupted halfway, so the previous state is restored from the journal
+            self.deployment_index = load_deployment_index(self.mod_manager_folder)
+            for operation in deploy_journal.operations:
+                if operation.old is None:
+                    self.deployment_index.pop(operation.path, None)
+                else:
+                    self.deployment_index[operation.path] = operation.old
+            self.backup_store.persist()
+            self._commit_deployment(deploy_journal.previous_deployed_mods)
+            remove_deploy_journal(self.mod_manager_folder)
+
+    def _commit_deployment(self, deployed_mods: List[str]):
+        persist_deployment_index(self.mod_manager_folder, self.deployment_index)
+        self.master_manifest.set_deployed_mods(deployed_mods)
+        # Written right away, the deployed mods have to match the deployment index
+        self.master_manifest.flush()
+        self.mod_registry_revision += 1
+
+    def verify_deployment(self, full: bool = False,
+                          progress: Optional[OperationProgress] = None) -> VerificationReport:
+        # Size and modification time are compared with the index first, only the files which differ are hashed,
+        # unless full is set
+        drifted = []
+        suspicious_paths = []
+        for path, deployed_file in self.deployment_index.items():
+            if deployed_file.backed_up and not self.backup_store.has_backup(path):
+                drifted.append(DriftedFile(path=path, mod=deployed_file.mod, reason=MISSING_BACKUP))
+            try:
+                deployed_file_stat = (self.game_folder / path).stat()
+            except FileNotFoundError:
+                drifted.append(DriftedFile(path=path, mod=deployed_file.mod, reason=MISSING))
+                continue
+            if full or (deployed_file_stat.st_size, deployed_file_stat.st_mtime_ns) != (deployed_file.size,
+                                                                                        deployed_file.mtime_ns):
+                suspicious_paths.append(path)
+
+        if progress is not None:
+            progress.start_stage("Verifying files", len(suspicious_paths),
+                                 sum(self.deployment_index[path].size for path in suspicious_paths))
+        with self._create_copy_engine(progress) as copy_engine:
+            for path in suspicious_paths:
+                copy_engine.submit(path, hash_file, self.game_folder / path, size=self.deployment_index[path].size)
+            content_hashes = copy_engine.wait()
+
+        touched_paths = []
+        for path, content_hash in zip(suspicious_paths, content_hashes):
+            deployed_file = self.deployment_index[path]
+            if content_hash == deployed_file.hash:
+                touched_paths.append(path)
+                continue
+            blob_path = self.blob_store.blob_path(deployed_file.hash)
+            damaged_blob = blob_path.is_file() and os.path.samefile(str(self.game_folder / path), str(blob_path))
+            drifted.append(DriftedFile(path=path, mod=deployed_file.mod,
+                                       reason=CORRUPTED_BLOB if damaged_blob else MODIFIED))
+        # Only the modification time changed, the next fast verification can skip them again
+        if touched_paths:
+            for path in touched_paths:
+                self.deployment_index[path] = self.deployment_index[path]._replace(
+                    mtime_ns=(self.game_folder / path).stat().st_mtime_ns)
+            persist_deployment_index(self.mod_manager_folder, self.deployment_index)
+        return VerificationReport(checked=len(self.deployment_index), hashed=len(suspicious_paths),
+                                  drifted=sorted(drifted))
+
+    def repair_drifted_files(self, verification_report: VerificationReport,
+                             progress: Optional[OperationProgress] = None) -> List[str]:
+        # Deploys the drifted files from the blob store again, returns the repaired paths
+        repairable_paths = sorted({drifted_file.path for drifted_file in verification_report.drifted
+                                   if drifted_file.reason in REPAIRABLE_REASONS
+                                   and drifted_file.path in self.deployment_index
+                                   and self.blob_store.has_blob(self.deployment_index[drifted_file.path].hash)})
+        if progress is not None:
+            progress.start_stage("Repairing files", len(repairable_paths),
+                                 sum(self.deployment_index[path].size for path in repairable_paths))
+        with self._create_copy_engine(progress) as copy_engine:
+            for path in repairable_paths:
+                copy_engine.submit(path, self._deploy_file, path, self.deployment_index[path].hash,
+                                   size=self.deployment_index[path].size)
+            modification_times = copy_engine.wait()
+        for path, modification_time in zip(repairable_paths, modification_times):
+            self.deployment_index[path] = self.deployment_index[path]._replace(mtime_ns=modification_time)
+        if repairable_paths:
+            persist_deployment_index(self.mod_manager_folder, self.deployment_index)
+        return repairable_paths
+
+    def get_deployed_file_owner(self, relative_path: str) -> Optional[str]:
+        deployed_file = self.deployment_index.get(relative_path)
+        return deployed_file.mod if deployed_file is not None else None
+
+    def get_deployed_files_of_mod(self, mod_name: str) -> List[str]:
+        return [path for path, deployed_file in self.deployment_index.items() if deployed_file.mod == mod_name]
+
+    def _load_deployment_index(self) -> DeploymentIndex:
+        if deployment_index_exists(self.mod_manager_folder) or not self.get_deployed_mod_names():
+            return load_deployment_index(self.mod_manager_folder)
+
+        # Deployed by a version which did not keep an index yet, reconstruct it once from the deployed mods
+        deployment_index = {}
+        for path, mod_name in self._resolve_file_owners(self.get_deployed_mod_names()).items():
+            deployed_file = self.game_folder / path
+            if not deployed_file.is_file():
+                continue
+            deployed_file_stat = deployed_file.stat()
+            deployment_index[path] = DeployedFile(mod=mod_name, hash=hash_file(deployed_file),
+                                                  size=deployed_file_stat.st_size,
+                                                  mtime_ns=deployed_file_stat.st_mtime_ns,
+                                                  backed_up=self.backup_store.has_backup(path))
+        persist_deployment_index(self.mod_manager_folder, deployment_index)
+        return deployment_index
+
+    def _get_mod_content_folder(self, mod_name: str) -> Path:
+        return self.managed_mods_folder / mod_name / self.MOD_CONTENT_SUBFOLDER_NAME
+
+    def _resolve_file_owners(self, mod_names: List[str]) -> Dict[str, str]:
+        # Only the winning mod of every path is deployed, later mods in the list override earlier ones
+        return resolve_file_owners(self._get_path_index(tuple(mod_names)))
+
+    def _deploy_file(self, relative_path: str, content_hash: str) -> int:
+        deploy_destination = self.game_folder / relative_path
+        self.blob_store.link_or_copy(content_hash, deploy_destination)
+        self.instrumentation.count(STAT)
+        return deploy_destination.stat().st_mtime_ns
+
+    def _backup_file(self, relative_path: str) -> bool:
+        # Originals which were backed up before, and are unchanged since, are not written again
+        return self.backup_store.back_up(self.game_folder / relative_path, relative_path)
+
+    def _undeploy_file(self, relative_path: str, backed_up: bool):
+        if backed_up:
+            # The backup is kept, restoring the same original again is harmless when resuming an interrupted run
+            self.backup_store.restore(relative_path, self.game_folder / relative_path)
+        else:
+            self._remove_file(self.game_folder / relative_path)
+
+    def _remove_file(self, path: Path):
+        self.instrumentation.count(STAT)
+        if path.is_file():
+            self.instrumentation.count(UNLINK)
+            os.remove(str(path))
+
+    def _redeploy_file(self, relative_path: str, deployed_file: DeployedFile):
+        # Rolls back the removal of a deployed file, whose original may have been restored already
+        if deployed_file.backed_up and not self.backup_store.has_backup(relative_path):
+            self._backup_file(relative_path)
+        self._deploy_file(relative_path, deployed_file.hash)
+
+    def _copy_file(self, source: Path, destination: Path):
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(str(source), str(destination))
+        if self.instrumentation.enabled:
+            copied_bytes = destination.stat().st_size
+            self.instrumentation.count(MKDIR)
+            self.instrumentation.count(FILES)
+            self.instrumentation.count(BYTES_READ, copied_bytes)
+            self.instrumentation.count(BYTES_WRITTEN, copied_bytes)
+
+    def find_mod_content_roots(self, folder: Path) -> List[ContentRoot]:
+        return find_content_roots(iterate_directories(folder), self.configuration["moddable_folders"])
+
+    def find_or_create_mod_content_folder(self, mod_archive_contents_folder: str,
+                                          progress: Optional[OperationProgress] = None) -> Path:
+        mod_archive_contents_folder_path = Path(mod_archive_contents_folder)
+        with self.instrumentation.phase("find_or_create_mod_content_folder", "scan"):
+            content_root = detect_mod_layout(iterate_directories(mod_archive_contents_folder_path),
+                                             self.configuration["moddable_folders"])
+
+        content_folder = mod_archive_contents_folder_path / content_root.source
+        if content_folder.name == content_root.destination:
+            return content_folder
+
+        # A hero skin, homogenise it under heroes/<hero name>
+        with self.instrumentation.phase("find_or_create_mod_content_folder", "homogenise"):
+            # Listed before copying, the copies may be created inside the walked source folder
+            mod_files = list(iterate_mod_files(mod_archive_contents_folder_path, content_root))
+            if progress is not None:
+                progress.start_stage("Copying hero skin files", len(mod_files),
+                                     sum(file_entry.size for _, file_entry in mod_files))
+            with self._create_copy_engine(progress) as copy_engine:
+                for mod_path, file_entry in mod_files:
+                    copy_engine.submit(file_entry.path, self._copy_file,
+                                       mod_archive_contents_folder_path / file_entry.path,
+                                       mod_archive_contents_folder_path / mod_path, size=file_entry.size)
+        return mod_archive_contents_folder_path / content_root.destination.split("/")[0]
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from atomic_file import write_json_atomically
+from content_hash import new_hasher
+from deploy_plan import FilePlan, PlannedFile
+
+PROFILES_FILENAME = "profiles.json"
+PROFILE_PLANS_FOLDER_NAME = "profile_plans"
+PROFILE_PLAN_VERSION = 2
+
+# The active mods of a profile, in load order
+Profile = NamedTuple("Profile", [("active_mods", List[str])])
+
+Profiles = Dict[str, Profile]
+
+# The plan is valid as long as the manifest of every member mod has the content hash recorded here
+CachedFilePlan = NamedTuple("CachedFilePlan", [("mod_versions", Dict[str, Optional[str]]), ("files", FilePlan)])
+
+
+def load_profiles(folder: Path) -> Profiles:
+    profiles_path = folder / PROFILES_FILENAME
+    if not profiles_path.is_file():
+        return {}
+    try:
+        with open(str(profiles_path), "r") as profiles_in_file:
+            return {name: Profile(**profile) for name, profile in json.load(profiles_in_file)["profiles"].items()}
+    except (KeyError, TypeError, ValueError) as e:
+        raise RuntimeError("Corrupt profiles {}, {}".format(profiles_path, e))
+
+
+def persist_profiles(folder: Path, profiles: Profiles):
+    write_json_atomically(folder / PROFILES_FILENAME,
+                          {"profiles": {name: profile._asdict() for name, profile in sorted(profiles.items())}},
+                          indent=2)
+
+
+def _get_cached_file_plan_path(folder: Path, profile_name: str) -> Path:
+    # Profile names may contain anything, the file is named after their hash
+    hasher = new_hasher()
+    hasher.update(profile_name.encode("utf-8"))
+    return folder / PROFILE_PLANS_FOLDER_NAME / (hasher.hexdigest() + ".json")
+
+
+def load_cached_file_plan(folder: Path, profile_name: str) -> Optional[CachedFilePlan]:
+    # A missing, outdated or unreadable plan is computed again, so it is never an error
+    cached_file_plan_path = _get_cached_file_plan_path(folder, profile_name)
+    try:
+        with open(str(cached_file_plan_path), "r") as plan_in_file:
+            plan_dict = json.load(plan_in_file)
+        if plan_dict["version"] != PROFILE_PLAN_VERSION or plan_dict["profile"] != profile_name:
+            return None
+        return CachedFilePlan(mod_versions=plan_dict["mod_versions"],
+                              files={path: PlannedFile(*entry) for path, entry in plan_dict["files"].items()})
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+
+def persist_cached_file_plan(folder: Path, profile_name: str, cached_file_plan: CachedFilePlan):
+    cached_file_plan_path = _get_cached_file_plan_path(folder, profile_name)
+    cached_file_plan_path.parent.mkdir(exist_ok=True)
+    write_json_atomically(cached_file_plan_path,
+                          {"version": PROFILE_PLAN_VERSION, "profile": profile_name,
+                           "mod_versions": cached_file_plan.mod_versions,
+                           "files": {path: list(entry) for path, entry in sorted(cached_file_plan.files.items())}},
+                          separators=(",", ":"))
+
+
+def remove_cached_file_plan(folder: Path, profile_name: str):
+    cached_file_plan_path = _get_cached_file_plan_path(folder, profile_name)
+    if cached_file_plan_path.is_file():
+        cached_file_plan_path.unlink()
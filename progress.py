@@ -0,0 +1,49 @@
+import threading
+from typing import NamedTuple
+
+ProgressSnapshot = NamedTuple("ProgressSnapshot", [("stage", str), ("files_done", int), ("files_total", int),
+                                                   ("bytes_done", int), ("bytes_total", int)])
+
+
+class OperationCancelled(RuntimeError):
+    def __init__(self):
+        super().__init__("Cancelled")
+
+
+class OperationProgress:
+    # Advanced by the worker threads of an operation, read and cancelled from any other thread, e.g. the GUI
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._snapshot = ProgressSnapshot(stage="", files_done=0, files_total=0, bytes_done=0, bytes_total=0)
+
+    def start_stage(self, stage: str, files_total: int = 0, bytes_total: int = 0):
+        with self._lock:
+            self._snapshot = ProgressSnapshot(stage=stage, files_done=0, files_total=files_total, bytes_done=0,
+                                              bytes_total=bytes_total)
+
+    def extend_stage(self, files: int, size: int = 0):
+        # For stages whose files are found while they run
+        with self._lock:
+            self._snapshot = self._snapshot._replace(files_total=self._snapshot.files_total + files,
+                                                     bytes_total=self._snapshot.bytes_total + size)
+
+    def advance(self, size: int = 0):
+        with self._lock:
+            self._snapshot = self._snapshot._replace(files_done=self._snapshot.files_done + 1,
+                                                     bytes_done=self._snapshot.bytes_done + size)
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            return self._snapshot
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise OperationCancelled()
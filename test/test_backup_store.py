@@ -0,0 +1,81 @@
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+from backup_store import BackupStore
+
+
+class TestBackupStore(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.temporary_directory_path = Path(self.temporary_directory.name)
+        self.backup_folder = self.temporary_directory_path / "original_data_backup"
+        self.game_folder = self.temporary_directory_path / "game"
+        self.backup_store = BackupStore(self.backup_folder)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _create_game_file(self, relative_path: str, content: bytes) -> Path:
+        game_file = self.game_folder / relative_path
+        game_file.parent.mkdir(parents=True, exist_ok=True)
+        game_file.write_bytes(content)
+        return game_file
+
+    def _list_objects(self):
+        return sorted(path.name for path in self.backup_store.objects_folder.rglob("*")
+                      if path.is_file() and path.parent != self.backup_store.temporary_folder)
+
+    def test_identical_originals_are_stored_once_and_text_is_compressed(self):
+        skeleton = b"bones " * 1000
+        for relative_path in ("heroes/arbalest/arbalest.skel", "heroes/crusader/crusader.skel"):
+            self.assertTrue(self.backup_store.back_up(self._create_game_file(relative_path, skeleton), relative_path))
+        self.backup_store.back_up(self._create_game_file("heroes/arbalest/icon.png", b"pixels"),
+                                  "heroes/arbalest/icon.png")
+
+        objects = self._list_objects()
+        self.assertEqual(2, len(objects))
+        compressed_object = next(self.backup_store.objects_folder.rglob("*.z"))
+        self.assertLess(compressed_object.stat().st_size, len(skeleton))
+
+        restored_file = self.game_folder / "heroes" / "crusader" / "crusader.skel"
+        restored_file.write_bytes(b"mod")
+        self.backup_store.restore("heroes/crusader/crusader.skel", restored_file)
+        self.assertEqual(skeleton, restored_file.read_bytes())
+
+    def test_unchanged_original_is_not_stored_again(self):
+        game_file = self._create_game_file("heroes/arbalest/arbalest.skel", b"bones")
+        self.backup_store.back_up(game_file, "heroes/arbalest/arbalest.skel")
+        self.backup_store.restore("heroes/arbalest/arbalest.skel", game_file)
+
+        with mock.patch.object(BackupStore, "_add_object") as add_object:
+            self.assertTrue(self.backup_store.back_up(game_file, "heroes/arbalest/arbalest.skel"))
+        add_object.assert_not_called()
+
+    def test_index_is_persisted(self):
+        game_file = self._create_game_file("heroes/arbalest/icon.png", b"pixels")
+        self.backup_store.back_up(game_file, "heroes/arbalest/icon.png")
+        self.backup_store.persist()
+
+        reloaded_backup_store = BackupStore(self.backup_folder)
+        self.assertTrue(reloaded_backup_store.has_backup("heroes/arbalest/icon.png"))
+        self.assertFalse(reloaded_backup_store.has_backup("heroes/crusader/icon.png"))
+
+    def test_legacy_backups_are_migrated(self):
+        legacy_backup = self.backup_folder / "heroes" / "arbalest" / "icon.png"
+        legacy_backup.parent.mkdir(parents=True)
+        legacy_backup.write_bytes(b"pixels")
+
+        backup_store = BackupStore(self.backup_folder)
+        backup_store.migrate_legacy_backups()
+
+        self.assertFalse((self.backup_folder / "heroes").exists())
+        self.assertTrue(BackupStore(self.backup_folder).has_backup("heroes/arbalest/icon.png"))
+        restored_file = self.game_folder / "heroes" / "arbalest" / "icon.png"
+        backup_store.restore("heroes/arbalest/icon.png", restored_file)
+        self.assertEqual(b"pixels", restored_file.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+from pathlib import Path
+import io
+import tempfile
+import unittest
+
+from blob_store import BlobStore
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.temporary_directory_path = Path(self.temporary_directory.name)
+        self.blob_store = BlobStore(self.temporary_directory_path / "objects")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_identical_contents_are_stored_once(self):
+        first_file = self.temporary_directory_path / "first.png"
+        first_file.write_bytes(b"pixels")
+        second_file = self.temporary_directory_path / "second.png"
+        second_file.write_bytes(b"pixels")
+
+        first_hash = self.blob_store.add_file(first_file)
+        second_hash = self.blob_store.add_stream(io.BytesIO(b"pixels"))
+
+        self.assertEqual(first_hash, self.blob_store.add_file(second_file))
+        self.assertEqual(first_hash, second_hash)
+        self.assertEqual(b"pixels", self.blob_store.blob_path(first_hash).read_bytes())
+        self.assertEqual([], [*self.blob_store.temporary_folder.iterdir()])
+
+    def test_link_or_copy_replaces_destination_without_touching_blob(self):
+        content_hash = self.blob_store.add_stream(io.BytesIO(b"skin"))
+        destination = self.temporary_directory_path / "game" / "heroes" / "icon.png"
+        destination.parent.mkdir(parents=True)
+        destination.write_bytes(b"original")
+
+        self.blob_store.link_or_copy(content_hash, destination)
+        self.assertEqual(b"skin", destination.read_bytes())
+
+        destination.unlink()
+        destination.write_bytes(b"restored")
+        self.assertEqual(b"skin", self.blob_store.blob_path(content_hash).read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
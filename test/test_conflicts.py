@@ -0,0 +1,24 @@
+import unittest
+
+from conflicts import build_path_index, find_conflicts, resolve_file_owners
+
+
+class TestConflicts(unittest.TestCase):
+    def setUp(self):
+        self.path_index = build_path_index([("A", ["heroes/a.png", "heroes/b.png"]),
+                                            ("B", ["heroes/b.png", "heroes/c.png"]),
+                                            ("C", ["heroes/b.png", "heroes/c.png", "heroes/d.png"])])
+
+    def test_later_mods_win(self):
+        self.assertEqual({"heroes/a.png": "A", "heroes/b.png": "C", "heroes/c.png": "C", "heroes/d.png": "C"},
+                         resolve_file_owners(self.path_index))
+
+    def test_conflicts_are_reported_per_mod_pair(self):
+        self.assertEqual({("A", "B"): ["heroes/b.png"],
+                          ("A", "C"): ["heroes/b.png"],
+                          ("B", "C"): ["heroes/b.png", "heroes/c.png"]},
+                         find_conflicts(self.path_index))
+
+
+if __name__ == "__main__":
+    unittest.main()
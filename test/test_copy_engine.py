@@ -0,0 +1,74 @@
+import threading
+import time
+import unittest
+
+from copy_engine import CopyEngine, CopyError
+from progress import OperationCancelled, OperationProgress
+
+
+class TestCopyEngine(unittest.TestCase):
+    def test_results_and_errors_are_in_submission_order(self):
+        def transfer(index: int) -> int:
+            # Later submissions finish first
+            time.sleep(0.01 * (5 - index))
+            if index in (1, 3):
+                raise OSError("failed {}".format(index))
+            return index
+
+        with CopyEngine(max_workers=5) as copy_engine:
+            for index in range(5):
+                copy_engine.submit("file{}".format(index), transfer, index)
+            with self.assertRaises(CopyError) as context:
+                copy_engine.wait()
+
+        self.assertEqual(["file1", "file3"], [description for description, _ in context.exception.failures])
+
+    def test_queued_bytes_stay_within_budget(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def transfer(size: int):
+            with lock:
+                in_flight[0] += size
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.005)
+            with lock:
+                in_flight[0] -= size
+
+        budget = 4 * 1024 * 1024
+        with CopyEngine(max_workers=8, max_queued_bytes=budget) as copy_engine:
+            for _ in range(20):
+                copy_engine.submit("file", transfer, 1024 * 1024, size=1024 * 1024)
+
+        self.assertLessEqual(in_flight[1], budget)
+
+    def test_progress_is_advanced_per_transfer(self):
+        progress = OperationProgress()
+        progress.start_stage("Copying", files_total=3, bytes_total=60)
+        with CopyEngine(max_workers=2, progress=progress) as copy_engine:
+            for size in (10, 20, 30):
+                copy_engine.submit("file", lambda: None, size=size)
+
+        snapshot = progress.snapshot()
+        self.assertEqual((3, 3, 60, 60), (snapshot.files_done, snapshot.files_total, snapshot.bytes_done,
+                                          snapshot.bytes_total))
+
+    def test_cancelling_skips_the_queued_transfers(self):
+        progress = OperationProgress()
+        transferred = []
+
+        def transfer(index: int):
+            transferred.append(index)
+            progress.cancel()
+
+        with self.assertRaises(OperationCancelled):
+            with CopyEngine(max_workers=1, progress=progress) as copy_engine:
+                copy_engine.submit("file0", transfer, 0)
+                time.sleep(0.05)
+                copy_engine.submit("file1", transfer, 1)
+
+        self.assertEqual([0], transferred)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from deploy_plan import plan_deployment
+
+
+class TestDeployPlan(unittest.TestCase):
+    def test_plan_contains_only_differences(self):
+        deployed_files = {"heroes/a.png": "A", "heroes/b.png": "A", "heroes/c.png": "B"}
+        desired_files = {"heroes/a.png": "A", "heroes/c.png": "C", "heroes/d.png": "C"}
+
+        deploy_plan = plan_deployment(deployed_files, desired_files)
+
+        self.assertEqual(["heroes/d.png"], deploy_plan.added)
+        self.assertEqual(["heroes/b.png"], deploy_plan.removed)
+        self.assertEqual(["heroes/c.png"], deploy_plan.changed)
+
+    def test_empty_plan_when_nothing_changed(self):
+        deployed_files = {"heroes/a.png": "A"}
+
+        deploy_plan = plan_deployment(deployed_files, dict(deployed_files))
+
+        self.assertEqual(([], [], []), tuple(deploy_plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+from pathlib import Path
+import sys
+import tempfile
+import time
+import unittest
+
+from folder_watcher import InotifyWatcher, PollingWatcher
+
+
+class TestFolderWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.temporary_directory.name)
+        (self.root / "heroes").mkdir()
+        self.modified_file = self.root / "heroes" / "modified.png"
+        self.modified_file.write_bytes(b"a")
+        self.deleted_file = self.root / "heroes" / "deleted.png"
+        self.deleted_file.write_bytes(b"a")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _change_files(self) -> Path:
+        self.modified_file.write_bytes(b"bb")
+        self.deleted_file.unlink()
+        created_file = self.root / "heroes" / "crusader" / "created.png"
+        created_file.parent.mkdir()
+        created_file.write_bytes(b"a")
+        return created_file
+
+    def test_polling_watcher_finds_changed_files(self):
+        watcher = PollingWatcher([self.root])
+        created_file = self._change_files()
+        watcher.poll()
+
+        dirty_paths = watcher.take_dirty_paths()
+        self.assertTrue(dirty_paths.complete)
+        self.assertEqual({self.modified_file, self.deleted_file, created_file}, dirty_paths.paths)
+        self.assertEqual(set(), watcher.take_dirty_paths().paths)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify_watcher_finds_changed_files(self):
+        watcher = InotifyWatcher([self.root])
+        watcher.start()
+        try:
+            created_file = self._change_files()
+            expected_paths = {self.modified_file, self.deleted_file, created_file}
+            dirty_paths = set()
+            deadline = time.monotonic() + 5
+            while not expected_paths <= dirty_paths and time.monotonic() < deadline:
+                time.sleep(0.05)
+                dirty_paths |= watcher.take_dirty_paths().paths
+        finally:
+            watcher.stop()
+
+        self.assertLessEqual(expected_paths, dirty_paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import argparse
+import contextlib
+import io
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+from main import add_command_parsers, run_command
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.temporary_directory_path = Path(self.temporary_directory.name)
+        self.argument_parser = argparse.ArgumentParser()
+        add_command_parsers(self.argument_parser)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _run_command(self, command_line):
+        arguments = self.argument_parser.parse_args(command_line)
+        arguments.manager_folder = self.temporary_directory_path
+        arguments.game_steam_folder = self.temporary_directory_path
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exit_code = run_command(arguments, {"moddable_folders": ["heroes"]})
+        return exit_code, json.loads(output.getvalue())
+
+    def test_invalid_source_is_reported_as_json(self):
+        not_an_archive = self.temporary_directory_path / "mod.txt"
+        not_an_archive.write_text("not an archive")
+
+        for source in [self.temporary_directory_path / "missing", not_an_archive]:
+            exit_code, result = self._run_command(["add", str(source)])
+            self.assertEqual(1, exit_code)
+            self.assertIn("error", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import master_manifest
+from master_manifest import load_master_manifest, MASTER_MANIFEST_FILENAME, MASTER_MANIFEST_VERSION, OrderedModSet
+
+
+class TestMasterManifest(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.folder = Path(self.temporary_directory.name)
+        self.manifest_path = self.folder / MASTER_MANIFEST_FILENAME
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _write_manifest(self, manifest_dict):
+        self.manifest_path.write_text(json.dumps(manifest_dict))
+
+    def _read_manifest(self):
+        return json.loads(self.manifest_path.read_text())
+
+    def test_ordered_mod_set_keeps_the_insertion_order(self):
+        mod_set = OrderedModSet(["B", "A"])
+        mod_set.add("C")
+        mod_set.add("B")
+        mod_set.remove("A")
+
+        self.assertEqual(["B", "C"], mod_set.as_list())
+        self.assertIn("C", mod_set)
+        self.assertNotIn("A", mod_set)
+
+    def test_changes_are_written_together_when_flushed(self):
+        manifest = load_master_manifest(self.folder, write_delay=60)
+        with mock.patch.object(master_manifest, "persist_master_manifest",
+                               wraps=master_manifest.persist_master_manifest) as persist:
+            manifest.activate_mod("A")
+            manifest.activate_mod("B")
+            manifest.deactivate_mod("A")
+            manifest.set_load_order(["B"])
+            self.assertEqual([], self._read_manifest()["active_mods"])
+
+            manifest.flush()
+            manifest.flush()
+
+        self.assertEqual(1, persist.call_count)
+        self.assertEqual({"version": MASTER_MANIFEST_VERSION, "active_mods": ["B"], "deployed_mods": [],
+                          "load_order": ["B"]}, self._read_manifest())
+
+    def test_changes_are_written_after_the_write_delay(self):
+        manifest = load_master_manifest(self.folder, write_delay=0.01)
+        manifest.activate_mod("A")
+        write_timer = manifest._write_timer
+        write_timer.join()
+
+        self.assertEqual(["A"], self._read_manifest()["active_mods"])
+
+    def test_unversioned_manifest_is_migrated(self):
+        self._write_manifest({"active_mods": ["A"], "deployed_mods": ["A"]})
+
+        manifest = load_master_manifest(self.folder)
+
+        self.assertEqual(["A"], manifest.active_mods.as_list())
+        self.assertEqual([], manifest.load_order.as_list())
+
+    def test_unknown_state_is_kept(self):
+        self._write_manifest({"version": MASTER_MANIFEST_VERSION, "active_mods": [], "deployed_mods": [],
+                              "load_order": [], "priorities": {"A": 1}})
+
+        manifest = load_master_manifest(self.folder, write_delay=0)
+        manifest.activate_mod("A")
+
+        self.assertEqual({"A": 1}, self._read_manifest()["priorities"])
+
+    def test_corrupt_manifest_is_kept_aside(self):
+        self._write_manifest({"version": MASTER_MANIFEST_VERSION, "active_mods": "A"})
+
+        manifest = load_master_manifest(self.folder)
+
+        self.assertEqual([], manifest.active_mods.as_list())
+        self.assertEqual("A", json.loads((self.folder / (MASTER_MANIFEST_FILENAME + ".corrupt")).read_text())[
+            "active_mods"])
+
+    def test_manifest_of_a_newer_version_is_not_replaced(self):
+        self._write_manifest({"version": MASTER_MANIFEST_VERSION + 1, "active_mods": [], "deployed_mods": [],
+                              "load_order": []})
+
+        with self.assertRaises(RuntimeError):
+            load_master_manifest(self.folder)
+        self.assertEqual(MASTER_MANIFEST_VERSION + 1, self._read_manifest()["version"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,23 @@
+import json
+import os
 from pathlib import Path
+import sys
+import time
 import unittest
 import tempfile
 from typing import List
+from unittest import mock
+import zipfile
 
-from gui import MainWindowModel
+from model import MainWindowModel
 from master_manifest import load_master_manifest, MasterManfiest
+from progress import OperationCancelled, OperationProgress
+from verification import group_drift_by_mod, DriftedFile
 
 
 class TestModel(unittest.TestCase):
     MANAGED_MODS_SUBFOLDER_NAME = "managed_mods"
     MOD_CONTENTS_SUBFOLDER_NAME = "_mod_contents"
-    BACKUP_FOLDER_NAME = "original_data_backup"
 
     def setUp(self):
         self.temporary_directory = tempfile.TemporaryDirectory()
@@ -61,6 +68,7 @@ class TestModel(unittest.TestCase):
         return hero_files_relative_to_heroes_folder, hero_type
 
     def tearDown(self):
+        self.model.close()
         self.temporary_directory.cleanup()
 
     def test_add_hero_mod(self):
@@ -88,6 +96,29 @@ class TestModel(unittest.TestCase):
         for expected_hero_file in expected_hero_files:
             self.assertTrue(expected_hero_file.is_file())
 
+    def test_add_hero_type_mod_at_the_root_of_the_folder(self):
+        hero_type_folder = self.input_mod_content_folder / "crusader_A"
+        for index in range(50):
+            self._create_empty_file(hero_type_folder, "frame_{}.png".format(index))
+
+        mod_content_folder = self.model.find_or_create_mod_content_folder(str(self.input_mod_content_folder))
+        self.model.add_mod("Root", mod_content_folder)
+
+        mod_contents = self.mod_manager_folder / self.MANAGED_MODS_SUBFOLDER_NAME / "Root" / \
+            self.MOD_CONTENTS_SUBFOLDER_NAME
+        self.assertEqual(sorted("heroes/crusader/crusader_A/frame_{}.png".format(index) for index in range(50)),
+                         sorted(path.relative_to(mod_contents).as_posix() for path in mod_contents.rglob("*.png")))
+
+    def test_add_hero_type_mod_inside_a_heroes_folder_next_to_other_moddable_folders(self):
+        self._create_empty_file(self.input_mod_content_folder / "heroes" / "arbalest_A", "icon.png")
+        self._create_empty_file(self.input_mod_content_folder / "panels", "x.png")
+        self.model.configuration["moddable_folders"] = ["heroes", "panels"]
+
+        mod_content_folder = self.model.find_or_create_mod_content_folder(str(self.input_mod_content_folder))
+        self.model.add_mod("Inside", mod_content_folder)
+
+        self.assertIn("heroes/arbalest/arbalest_A/icon.png", self.model._get_mod_manifest("Inside"))
+
     def test_activate_deactivate_mod_with_deployment(self):
         hero_file = self._create_hero_skin_mod_content()
 
@@ -98,6 +129,7 @@ class TestModel(unittest.TestCase):
         mod_content_folder = self.model.find_or_create_mod_content_folder(str(self.input_mod_content_folder))
         self.model.add_mod(mod_name, mod_content_folder)
         self.model.activate_mod(mod_name)
+        self.model.master_manifest.flush()
 
         master_manifest = load_master_manifest(self.mod_manager_folder)
         self.assertTrue(mod_name in master_manifest.active_mods)
@@ -105,17 +137,17 @@ class TestModel(unittest.TestCase):
 
         self.model.deploy_mods()
         deployed_file = self.game_folder / "heroes" / hero_file
-        backup_file = self.mod_manager_folder / self.BACKUP_FOLDER_NAME / "heroes" / hero_file
+        backup_path = ("heroes" / hero_file).as_posix()
 
         master_manifest = load_master_manifest(self.mod_manager_folder)
         self.assertTrue(mod_name in master_manifest.deployed_mods)
         self.assertTrue(mod_name in self.model.get_deployed_mod_names())
         self.assertTrue(deployed_file.is_file())
         self.assertEqual(0, deployed_file.stat().st_size)
-        self.assertTrue(backup_file.is_file())
-        self.assertNotEqual(0, backup_file.stat().st_size)
+        self.assertTrue(self.model.backup_store.has_backup(backup_path))
 
         self.model.deactivate_mod(mod_name)
+        self.model.master_manifest.flush()
         master_manifest = load_master_manifest(self.mod_manager_folder)
         self.assertFalse(mod_name in master_manifest.active_mods)
         self.assertFalse(mod_name in self.model.get_active_mod_names())
@@ -126,7 +158,527 @@ class TestModel(unittest.TestCase):
         self.assertFalse(mod_name in master_manifest.deployed_mods)
         self.assertFalse(mod_name in self.model.get_deployed_mod_names())
         self.assertNotEqual(0, deployed_file.stat().st_size)
-        self.assertFalse(backup_file.is_file())
+        # Kept, the unchanged original is not backed up again by the next deploy
+        self.assertTrue(self.model.backup_store.has_backup(backup_path))
+
+    def _add_mod_with_files(self, mod_name: str, relative_paths: List[str], content: str) -> None:
+        source_folder = self.temporary_directory_path / "source_{}".format(mod_name)
+        for relative_path in relative_paths:
+            source_file = source_folder / "heroes" / relative_path
+            source_file.parent.mkdir(parents=True, exist_ok=True)
+            source_file.write_text(content)
+        self.model.add_mod(mod_name, source_folder / "heroes")
+
+    def test_incremental_deployment_keeps_untouched_mod_files(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png", "arbalest/fx.png"], "a")
+        self._add_mod_with_files("B", ["arbalest/icon.png", "crusader/icon.png"], "b")
+        self.model.activate_mod("A")
+        self.model.activate_mod("B")
+        self.model.deploy_mods()
+
+        arbalest_icon = self.game_folder / "heroes" / "arbalest" / "icon.png"
+        arbalest_fx = self.game_folder / "heroes" / "arbalest" / "fx.png"
+        crusader_icon = self.game_folder / "heroes" / "crusader" / "icon.png"
+        self.assertEqual("b", arbalest_icon.read_text())
+        self.assertEqual("a", arbalest_fx.read_text())
+        self.assertEqual("b", crusader_icon.read_text())
+
+        self.model.deactivate_mod("B")
+        self.model.deploy_mods()
+
+        self.assertEqual("a", arbalest_icon.read_text())
+        self.assertEqual("a", arbalest_fx.read_text())
+        self.assertFalse(crusader_icon.exists())
+
+    def test_deployment_index_is_persisted(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self._add_mod_with_files("B", ["arbalest/icon.png", "crusader/icon.png"], "b")
+        self.model.activate_mod("A")
+        self.model.activate_mod("B")
+        self.model.deploy_mods()
+
+        reloaded_model = MainWindowModel({"moddable_folders": ["heroes"]},
+                                         mod_manager_folder=str(self.mod_manager_folder),
+                                         game_folder=str(self.game_folder))
+
+        self.assertEqual("B", reloaded_model.get_deployed_file_owner("heroes/arbalest/icon.png"))
+        self.assertIsNone(reloaded_model.get_deployed_file_owner("heroes/arbalest/fx.png"))
+        self.assertEqual(["heroes/arbalest/icon.png", "heroes/crusader/icon.png"],
+                         sorted(reloaded_model.get_deployed_files_of_mod("B")))
+        self.assertEqual([], reloaded_model.get_deployed_files_of_mod("A"))
+
+    def test_deploy_phases_are_reported_to_observers(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self.model.activate_mod("A")
+        phase_records = []
+        self.model.add_instrumentation_observer(phase_records.append)
+        self.model.deploy_mods()
+
+        self.assertEqual(["plan", "journal", "backup", "apply", "commit"],
+                         [phase_record.phase for phase_record in phase_records])
+        self.assertEqual({"deploy_mods"}, {phase_record.operation for phase_record in phase_records})
+        apply_record = phase_records[3]
+        self.assertEqual(1, apply_record.counters["files"])
+        self.assertEqual(1, apply_record.counters["link"])
+
+    def test_instrumentation_log_is_written_when_configured(self):
+        configuration = {"moddable_folders": ["heroes"], "instrumentation_log": True}
+        self.model = MainWindowModel(configuration, mod_manager_folder=str(self.mod_manager_folder),
+                                     game_folder=str(self.game_folder))
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+
+        with open(str(self.mod_manager_folder / "instrumentation.jsonl")) as log_file:
+            logged_phases = [json.loads(line)["phase"] for line in log_file]
+        self.assertEqual(["store", "link"], logged_phases)
+
+    def test_mod_registry_revision_changes_with_the_mods(self):
+        revision = self.model.mod_registry_revision
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self.assertTrue(self.model.is_mod_managed("A"))
+        self.assertEqual(["A"], self.model.get_managed_mod_names())
+        self.assertNotEqual(revision, self.model.mod_registry_revision)
+
+        for change in (lambda: self.model.activate_mod("A"), self.model.deploy_mods,
+                       lambda: self.model.deactivate_mod("A")):
+            revision = self.model.mod_registry_revision
+            change()
+            self.assertNotEqual(revision, self.model.mod_registry_revision)
+
+        revision = self.model.mod_registry_revision
+        self.model.get_managed_mod_names()
+        self.model.get_conflicts()
+        self.assertEqual(revision, self.model.mod_registry_revision)
+
+    def _start_polling_watcher(self):
+        self.model.configuration["folder_watcher"] = "polling"
+        self.model.configuration["folder_watcher_polling_interval"] = 3600
+        self.model.start_watching()
+        self.addCleanup(self.model.stop_watching)
+
+    def test_file_replaced_by_a_game_update_becomes_the_original(self):
+        game_file = self._create_non_empty_file(self.game_folder / "heroes" / "arbalest", "icon.png")
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "mod")
+        self.model.activate_mod("A")
+        self.model.deploy_mods()
+        self._start_polling_watcher()
+
+        # Replaced, never written through, the deployed file is a link to the blob
+        game_file.unlink()
+        game_file.write_text("updated")
+        self.model.folder_watcher.poll()
+        self.assertEqual(["heroes/arbalest/icon.png"], self.model.revalidate_changed_files())
+        self.model.deploy_mods()
+        self.assertEqual("mod", game_file.read_text())
+
+        self.model.deactivate_mod("A")
+        self.model.deploy_mods()
+        self.assertEqual("updated", game_file.read_text())
+
+    def test_deployed_file_written_in_place_keeps_the_original(self):
+        game_file = self._create_non_empty_file(self.game_folder / "heroes" / "arbalest", "icon.png")
+        game_file.write_text("ORIGINAL")
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "mod")
+        self.model.activate_mod("A")
+        self.model.deploy_mods()
+        self._start_polling_watcher()
+
+        # Written through the link, which changes the blob too
+        game_file.write_text("tweaked")
+        self.model.folder_watcher.poll()
+        self.assertEqual(["heroes/arbalest/icon.png"], self.model.revalidate_changed_files())
+        self.model.deploy_mods()
+        self.assertEqual("tweaked", game_file.read_text())
+
+        self.model.deactivate_mod("A")
+        self.model.deploy_mods()
+        self.assertEqual("ORIGINAL", game_file.read_text())
+        self.assertEqual([], self.model.verify_deployment(full=True).drifted)
+
+    def test_mod_file_edited_in_place_is_hashed_again(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "b")
+        self._add_mod_with_files("B", ["crusader/icon.png"], "b")
+        self.model.activate_mod("B")
+        self.model.deploy_mods()
+        self._start_polling_watcher()
+
+        mod_file = self.mod_manager_folder / "managed_mods" / "A" / "_mod_contents" / "heroes" / "arbalest" / "icon.png"
+        mod_file.write_text("edited in place")
+        self.model.folder_watcher.poll()
+        self.model.revalidate_changed_files()
+
+        content_hashes = {mod_name: self.model._get_mod_manifest(mod_name)[path].hash
+                          for mod_name, path in [("A", "heroes/arbalest/icon.png"), ("B", "heroes/crusader/icon.png")]}
+        # The blob both mods shared is gone, neither of them is left with a hash its content doesn't match
+        self.assertEqual(content_hashes["A"], content_hashes["B"])
+        self.assertEqual(b"edited in place", self.model.blob_store.blob_path(content_hashes["A"]).read_bytes())
+        self.model.deploy_mods()
+        self.assertEqual([], self.model.verify_deployment(full=True).drifted)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_mod_sharing_a_blob_edited_in_place_is_hashed_again_without_an_event(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "b")
+        self._add_mod_with_files("B", ["crusader/icon.png"], "b")
+        self.model.configuration["folder_watcher"] = "inotify"
+        self.model.start_watching()
+        self.addCleanup(self.model.stop_watching)
+        self.assertEqual("InotifyWatcher", type(self.model.folder_watcher).__name__)
+
+        mod_file = self.mod_manager_folder / "managed_mods" / "A" / "_mod_contents" / "heroes" / "arbalest" / "icon.png"
+        mod_file.write_text("edited in place")
+        original_hash = self.model._get_mod_manifest("A")["heroes/arbalest/icon.png"].hash
+        deadline = time.monotonic() + 5
+        while self.model._get_mod_manifest("A")["heroes/arbalest/icon.png"].hash == original_hash and \
+                time.monotonic() < deadline:
+            time.sleep(0.05)
+            self.model.revalidate_changed_files()
+
+        # Only A's path had an event, B is a further link to the same file
+        b_hash = self.model._get_mod_manifest("B")["heroes/crusader/icon.png"].hash
+        self.assertNotEqual(original_hash, b_hash)
+        self.assertTrue(self.model.blob_store.has_blob(b_hash))
+        self.model.activate_mod("B")
+        self.model.deploy_mods()
+        self.assertEqual("edited in place", (self.game_folder / "heroes" / "crusader" / "icon.png").read_text())
+        self.assertEqual([], self.model.verify_deployment(full=True).drifted)
+
+    def test_hand_edited_mod_file_is_deployed(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "mod")
+        self.model.activate_mod("A")
+        self.model.deploy_mods()
+        self._start_polling_watcher()
+
+        mod_file = self.mod_manager_folder / "managed_mods" / "A" / "_mod_contents" / "heroes" / "arbalest" / "icon.png"
+        mod_file.unlink()
+        mod_file.write_text("edited")
+        self.model.folder_watcher.poll()
+        self.model.deploy_mods()
+
+        self.assertEqual("edited", (self.game_folder / "heroes" / "arbalest" / "icon.png").read_text())
+
+    def test_verify_reports_and_repairs_drift_per_mod(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png", "arbalest/fx.png"], "a")
+        self._add_mod_with_files("B", ["crusader/icon.png"], "b")
+        self.model.activate_mod("A")
+        self.model.activate_mod("B")
+        self.model.deploy_mods()
+        self.assertEqual([], self.model.verify_deployment().drifted)
+
+        heroes_folder = self.game_folder / "heroes"
+        (heroes_folder / "arbalest" / "icon.png").unlink()
+        (heroes_folder / "crusader" / "icon.png").unlink()
+        (heroes_folder / "crusader" / "icon.png").write_text("x")
+        touched_file = heroes_folder / "arbalest" / "fx.png"
+        os.utime(str(touched_file), ns=(0, 0))
+
+        verification_report = self.model.verify_deployment()
+        self.assertEqual(2, verification_report.hashed)
+        self.assertEqual({"A": [DriftedFile(path="heroes/arbalest/icon.png", mod="A", reason="missing")],
+                          "B": [DriftedFile(path="heroes/crusader/icon.png", mod="B", reason="modified")]},
+                         group_drift_by_mod(verification_report))
+
+        self.assertEqual(["heroes/arbalest/icon.png", "heroes/crusader/icon.png"],
+                         self.model.repair_drifted_files(verification_report))
+        self.assertEqual("b", (heroes_folder / "crusader" / "icon.png").read_text())
+        verification_report = self.model.verify_deployment()
+        self.assertEqual((0, []), (verification_report.hashed, verification_report.drifted))
+
+    def test_mods_sharing_files_are_deduplicated(self):
+        self._add_mod_with_files("A", ["arbalest/fx.png"], "shared")
+        self._add_mod_with_files("B", ["crusader/fx.png"], "shared")
+
+        blob_folder = self.mod_manager_folder / "objects"
+        blobs = [path for path in blob_folder.rglob("*")
+                 if path.is_file() and path.relative_to(blob_folder).parts[0] != "tmp"]
+        self.assertEqual(1, len(blobs))
+
+    def _create_zip_archive(self, member_names: List[str]) -> Path:
+        archive_path = self.temporary_directory_path / "mod.zip"
+        with zipfile.ZipFile(str(archive_path), "w") as zip_file:
+            for member_name in member_names:
+                zip_file.writestr(member_name, member_name)
+        return archive_path
+
+    def test_add_hero_type_mod_from_zip(self):
+        archive_path = self._create_zip_archive(["SkinMod42/readme.txt",
+                                                 "SkinMod42/some_dir/arbalest_X/icon.png",
+                                                 "SkinMod42/some_dir/fx.png"])
+
+        content_root = self.model.find_zip_mod_content(archive_path)
+        self.model.add_mod_from_zip("Zipped", archive_path, content_root)
+
+        mod_content_folder = self.mod_manager_folder / self.MANAGED_MODS_SUBFOLDER_NAME / "Zipped" / \
+            self.MOD_CONTENTS_SUBFOLDER_NAME
+        self.assertEqual("SkinMod42/some_dir/arbalest_X/icon.png",
+                         (mod_content_folder / "heroes" / "arbalest" / "arbalest_X" / "icon.png").read_text())
+        self.assertTrue((mod_content_folder / "heroes" / "arbalest" / "fx.png").is_file())
+        self.assertFalse((mod_content_folder / "readme.txt").exists())
+
+    def test_add_moddable_folder_mod_from_zip(self):
+        archive_path = self._create_zip_archive(["Pack/heroes/crusader/icon.png", "Pack/readme.txt"])
+
+        content_root = self.model.find_zip_mod_content(archive_path)
+        self.model.add_mod_from_zip("Zipped", archive_path, content_root)
+        self.model.activate_mod("Zipped")
+        self.model.deploy_mods()
+
+        self.assertEqual("Pack/heroes/crusader/icon.png",
+                         (self.game_folder / "heroes" / "crusader" / "icon.png").read_text())
+
+    def test_import_mods_reports_every_source(self):
+        archive_path = self._create_zip_archive(["Pack/heroes/crusader/icon.png"])
+        hero_folder = self.input_mod_content_folder / "Folder Mod" / "vestal_B"
+        self._create_non_empty_file(hero_folder, "icon.png")
+        broken_folder = self.input_mod_content_folder / "Broken"
+        self._create_non_empty_file(broken_folder, "readme.txt")
+        self._add_mod_with_files("Existing", ["arbalest/icon.png"], "a")
+        existing_folder = self.input_mod_content_folder / "Existing"
+        existing_folder.mkdir()
+
+        import_report = self.model.import_mods([archive_path, hero_folder.parent, broken_folder, existing_folder])
+
+        self.assertEqual(["mod", "Folder Mod"], import_report.succeeded)
+        self.assertEqual([str(existing_folder)], [source for source, _ in import_report.skipped])
+        self.assertEqual([str(broken_folder)], [source for source, _ in import_report.failed])
+        managed_mods_folder = self.mod_manager_folder / self.MANAGED_MODS_SUBFOLDER_NAME
+        self.assertTrue((managed_mods_folder / "Folder Mod" / self.MOD_CONTENTS_SUBFOLDER_NAME / "heroes" / "vestal" /
+                         "vestal_B" / "icon.png").is_file())
+        self.assertFalse((managed_mods_folder / "Broken").exists())
+
+    def test_find_mod_content_roots_reports_every_root(self):
+        self._create_empty_file(self.input_mod_content_folder / "Pack" / "heroes" / "crusader", "icon.png")
+        self._create_empty_file(self.input_mod_content_folder / "Pack" / "extras" / "vestal_B", "icon.png")
+        self._create_empty_file(self.input_mod_content_folder / "Pack" / "extras" / "vestal_C", "icon.png")
+
+        content_roots = self.model.find_mod_content_roots(self.input_mod_content_folder)
+
+        self.assertEqual([("Pack/extras", "heroes/vestal"), ("Pack/heroes", "heroes")],
+                         [tuple(content_root) for content_root in content_roots])
+
+    def test_load_order_decides_the_deployed_file(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self._add_mod_with_files("B", ["arbalest/icon.png"], "b")
+        self.model.activate_mod("A")
+        self.model.activate_mod("B")
+        self.assertEqual({("A", "B"): ["heroes/arbalest/icon.png"]}, self.model.get_conflicts())
+
+        self.model.move_mod_in_load_order("B", -1)
+        self.model.deploy_mods()
+
+        self.assertEqual(["B", "A"], self.model.get_deployed_mod_names())
+        self.assertEqual({("B", "A"): ["heroes/arbalest/icon.png"]}, self.model.get_conflicts())
+        self.assertEqual("a", (self.game_folder / "heroes" / "arbalest" / "icon.png").read_text())
+        self.assertEqual(["B", "A"], load_master_manifest(self.mod_manager_folder).load_order)
+
+    def test_mod_name_lists_are_copies(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self.model.activate_mod("A")
+        self.model.deploy_mods()
+
+        self.model.get_active_mod_names().clear()
+        self.model.get_deployed_mod_names().clear()
+
+        self.assertEqual(["A"], self.model.get_active_mod_names())
+        self.assertEqual(["A"], self.model.get_deployed_mod_names())
+
+    def test_switch_profile_deploys_its_mods_with_a_cached_file_plan(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self._add_mod_with_files("B", ["arbalest/icon.png", "crusader/icon.png"], "b")
+        arbalest_icon = self.game_folder / "heroes" / "arbalest" / "icon.png"
+        crusader_icon = self.game_folder / "heroes" / "crusader" / "icon.png"
+        self.model.activate_mod("A")
+        self.model.save_profile("only A")
+        self.model.activate_mod("B")
+        self.model.move_mod_in_load_order("B", -1)
+        self.model.save_profile("B over A")
+        self.assertEqual(["B over A", "only A"], self.model.get_profile_names())
+
+        self.model.switch_profile("only A")
+        self.assertEqual(["A"], self.model.get_deployed_mod_names())
+        self.assertEqual("a", arbalest_icon.read_text())
+        self.assertFalse(crusader_icon.exists())
+
+        with mock.patch.object(MainWindowModel, "_resolve_file_plan", side_effect=AssertionError):
+            self.model.switch_profile("B over A")
+        self.assertEqual(["B", "A"], self.model.get_deployed_mod_names())
+        self.assertEqual("a", arbalest_icon.read_text())
+        self.assertEqual("b", crusader_icon.read_text())
+
+        # Editing a file of a member mod rewrites its manifest, which invalidates the cached plan
+        self._start_polling_watcher()
+        mod_file = self.mod_manager_folder / "managed_mods" / "A" / "_mod_contents" / "heroes" / "arbalest" / "icon.png"
+        mod_file.unlink()
+        mod_file.write_text("edited")
+        self.model.folder_watcher.poll()
+        self.model.switch_profile("only A")
+        self.assertEqual(["A"], self.model.get_active_mod_names())
+        self.assertEqual("edited", arbalest_icon.read_text())
+        self.assertFalse(crusader_icon.exists())
+
+    def test_cached_file_plan_is_invalidated_by_a_manifest_of_the_same_size_and_time(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self._add_mod_with_files("B", ["arbalest/icon.png"], "b")
+        self.model.activate_mod("A")
+        self.model.save_profile("only A")
+        self.model.close()
+
+        # Rewritten on a filesystem with coarse modification times, the manifest keeps its size and time
+        manifest_path = self.mod_manager_folder / "managed_mods" / "A" / "mod_manifest.json"
+        manifest_stat = manifest_path.stat()
+        old_hash = json.loads(manifest_path.read_text())["files"]["heroes/arbalest/icon.png"][0]
+        new_hash = json.loads((manifest_path.parent.parent / "B" / "mod_manifest.json").read_text())["files"][
+            "heroes/arbalest/icon.png"][0]
+        manifest_path.write_text(manifest_path.read_text().replace(old_hash, new_hash))
+        os.utime(str(manifest_path), ns=(manifest_stat.st_atime_ns, manifest_stat.st_mtime_ns))
+        self.assertEqual(manifest_stat.st_size, manifest_path.stat().st_size)
+
+        self.model = MainWindowModel({"moddable_folders": ["heroes"]}, mod_manager_folder=str(self.mod_manager_folder),
+                                     game_folder=str(self.game_folder))
+        self.model.switch_profile("only A")
+        self.assertEqual("b", (self.game_folder / "heroes" / "arbalest" / "icon.png").read_text())
+
+    def test_bundles_transfer_only_the_missing_files(self):
+        bundle_folder = self.temporary_directory_path / "bundle"
+        other_manager_folder = self.temporary_directory_path / "other_manager"
+        other_manager_folder.mkdir()
+        other_model = MainWindowModel({"moddable_folders": ["heroes"]}, mod_manager_folder=str(other_manager_folder),
+                                      game_folder=str(self.game_folder))
+        self._add_mod_with_files("A", ["arbalest/icon.png", "arbalest/fx.png"], "a")
+
+        self.assertEqual((["A"], [], 1, 1), tuple(self.model.export_mods(bundle_folder)))
+        self.assertEqual((["A"], [], 1, 1), tuple(other_model.import_bundle(bundle_folder)))
+
+        self._add_mod_with_files("B", ["crusader/icon.png", "crusader/fx.png"], "bb")
+        self.assertEqual((["A", "B"], [], 1, 2), tuple(self.model.export_mods(bundle_folder)))
+        self.assertEqual((["B"], [("A", "up to date")], 1, 2), tuple(other_model.import_bundle(bundle_folder)))
+
+        other_model.activate_mod("B")
+        other_model.deploy_mods()
+        self.assertEqual("bb", (self.game_folder / "heroes" / "crusader" / "fx.png").read_text())
+
+    def test_corrupt_bundle_file_is_not_imported(self):
+        bundle_folder = self.temporary_directory_path / "bundle"
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self.model.export_mods(bundle_folder)
+        for blob_path in (bundle_folder / "blobs").rglob("*"):
+            if blob_path.is_file():
+                blob_path.write_text("tampered")
+        other_manager_folder = self.temporary_directory_path / "other_manager"
+        other_manager_folder.mkdir()
+        other_model = MainWindowModel({"moddable_folders": ["heroes"]}, mod_manager_folder=str(other_manager_folder),
+                                      game_folder=str(self.game_folder))
+
+        with self.assertRaises(RuntimeError):
+            other_model.import_bundle(bundle_folder)
+        self.assertEqual([], other_model.get_managed_mod_names())
+
+    def test_unsafe_bundle_is_not_imported(self):
+        bundle_folder = self.temporary_directory_path / "bundle"
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self.model.export_mods(bundle_folder)
+        bundle_dict = json.loads((bundle_folder / "bundle.json").read_text())
+        content_hash, size = bundle_dict["mods"]["A"]["heroes/arbalest/icon.png"]
+        other_manager_folder = self.temporary_directory_path / "other_manager"
+        other_manager_folder.mkdir()
+        other_model = MainWindowModel({"moddable_folders": ["heroes"]}, mod_manager_folder=str(other_manager_folder),
+                                      game_folder=str(self.game_folder))
+        self.addCleanup(other_model.close)
+
+        for mod_name, path, file_hash in [("A", "heroes/../../../escaped.txt", content_hash),
+                                          ("A", "/heroes/icon.png", content_hash),
+                                          ("A", "campaign/icon.png", content_hash),
+                                          ("../A", "heroes/arbalest/icon.png", content_hash),
+                                          ("", "heroes/arbalest/icon.png", content_hash),
+                                          ("A", "heroes/arbalest/icon.png", "../../" + content_hash[6:]),
+                                          ("A", "heroes/arbalest/icon.png", content_hash.upper())]:
+            bundle_dict["mods"] = {mod_name: {path: [file_hash, size]}}
+            (bundle_folder / "bundle.json").write_text(json.dumps(bundle_dict))
+            with self.assertRaises(RuntimeError, msg=(mod_name, path, file_hash)):
+                other_model.import_bundle(bundle_folder)
+        self.assertEqual([], other_model.get_managed_mod_names())
+        self.assertEqual([], [*(other_manager_folder / "import_staging").iterdir()])
+
+    def _interrupt_deploy_of_second_mod(self) -> (Path, Path):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self._add_mod_with_files("B", ["arbalest/icon.png", "crusader/icon.png"], "b")
+        crusader_icon = self._create_non_empty_file(self.game_folder / "heroes" / "crusader", "icon.png")
+        self.model.activate_mod("A")
+        self.model.deploy_mods()
+        self.model.activate_mod("B")
+
+        original_deploy_file = MainWindowModel._deploy_file
+
+        def fail_on_crusader(model, relative_path, content_hash):
+            if "crusader" in relative_path:
+                raise OSError("disk full")
+            return original_deploy_file(model, relative_path, content_hash)
+
+        # The process "dies" during the rollback, leaving the journal behind
+        with mock.patch.object(MainWindowModel, "_deploy_file", fail_on_crusader), \
+                mock.patch.object(MainWindowModel, "_roll_back_deploy_journal", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.model.deploy_mods()
+        return self.game_folder / "heroes" / "arbalest" / "icon.png", crusader_icon
+
+    def test_failed_deploy_is_rolled_back(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png"], "a")
+        self.model.activate_mod("A")
+
+        with mock.patch.object(MainWindowModel, "_deploy_file", side_effect=OSError("disk full")):
+            with self.assertRaises(RuntimeError):
+                self.model.deploy_mods()
+
+        self.assertFalse((self.game_folder / "heroes" / "arbalest" / "icon.png").exists())
+        self.assertEqual([], self.model.get_deployed_mod_names())
+        self.assertFalse((self.mod_manager_folder / "deploy_journal.json").exists())
+
+    def test_cancelled_deploy_is_rolled_back(self):
+        self._add_mod_with_files("A", ["arbalest/icon.png", "crusader/icon.png"], "a")
+        self.model.activate_mod("A")
+        progress = OperationProgress()
+        original_deploy_file = MainWindowModel._deploy_file
+
+        def cancel_after_first_file(model, relative_path, content_hash):
+            progress.cancel()
+            return original_deploy_file(model, relative_path, content_hash)
+
+        with mock.patch.object(MainWindowModel, "_deploy_file", cancel_after_first_file), \
+                mock.patch.dict(self.model.configuration, {"copy_workers": 1}):
+            with self.assertRaises(OperationCancelled):
+                self.model.deploy_mods(progress)
+
+        self.assertEqual([], list((self.game_folder / "heroes").rglob("*.png")))
+        self.assertEqual([], self.model.get_deployed_mod_names())
+        self.assertEqual({}, self.model.deployment_index)
+
+    def test_interrupted_deploy_is_rolled_back_on_startup(self):
+        arbalest_icon, crusader_icon = self._interrupt_deploy_of_second_mod()
+
+        reloaded_model = MainWindowModel({"moddable_folders": ["heroes"]},
+                                         mod_manager_folder=str(self.mod_manager_folder),
+                                         game_folder=str(self.game_folder))
+
+        self.assertEqual(["A"], reloaded_model.get_deployed_mod_names())
+        self.assertEqual("a", arbalest_icon.read_text())
+        self.assertEqual("a", crusader_icon.read_text())
+        self.assertEqual("A", reloaded_model.get_deployed_file_owner("heroes/arbalest/icon.png"))
+        self.assertIsNone(reloaded_model.get_deployed_file_owner("heroes/crusader/icon.png"))
+        self.assertTrue(reloaded_model.backup_store.has_backup("heroes/crusader/icon.png"))
+
+    def test_interrupted_deploy_is_resumed_on_startup(self):
+        arbalest_icon, crusader_icon = self._interrupt_deploy_of_second_mod()
+
+        reloaded_model = MainWindowModel({"moddable_folders": ["heroes"], "interrupted_deploy_action": "resume"},
+                                         mod_manager_folder=str(self.mod_manager_folder),
+                                         game_folder=str(self.game_folder))
+
+        self.assertEqual(["A", "B"], reloaded_model.get_deployed_mod_names())
+        self.assertEqual("b", arbalest_icon.read_text())
+        self.assertEqual("b", crusader_icon.read_text())
+        self.assertEqual("B", reloaded_model.get_deployed_file_owner("heroes/crusader/icon.png"))
+
+        reloaded_model.deactivate_mod("B")
+        reloaded_model.deploy_mods()
+        self.assertEqual("a", crusader_icon.read_text())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+from typing import Dict, List, NamedTuple
+
+# Reasons a deployed file drifted from the deployment index
+MISSING = "missing"
+MODIFIED = "modified"
+# The deployed file was written through its hardlink, so the blob of the mod is damaged too and can't repair it
+CORRUPTED_BLOB = "corrupted_blob"
+MISSING_BACKUP = "missing_backup"
+REPAIRABLE_REASONS = [MISSING, MODIFIED]
+
+DriftedFile = NamedTuple("DriftedFile", [("path", str), ("mod", str), ("reason", str)])
+
+VerificationReport = NamedTuple("VerificationReport", [("checked", int), ("hashed", int),
+                                                       ("drifted", List[DriftedFile])])
+
+
+def group_drift_by_mod(verification_report: VerificationReport) -> Dict[str, List[DriftedFile]]:
+    drift_by_mod = {}
+    for drifted_file in verification_report.drifted:
+        drift_by_mod.setdefault(drifted_file.mod, []).append(drifted_file)
+    return drift_by_mod